@@ -7,11 +7,13 @@ the quality and accuracy of security documentation. Each agent has a specific
 role and expertise area, allowing for comprehensive review and enhancement.
 """
 
+import re
 import json
-import requests
 import time
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+import hashlib
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Tuple, Optional
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 import os
 import sys
@@ -21,11 +23,80 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from .research_summary import ResearchSummaryManager
+    from .llm_client import DEFAULT_MODEL, JSONObjectStop, LLMError, get_client
+    from .prompt_budget import CHARS_PER_TOKEN, PromptSection, estimate_tokens, fit_sections, prompt_budget
+    from .llm_telemetry import llm_tags
+    from .llm_dispatcher import get_dispatcher
 except ImportError:
     from research_summary import ResearchSummaryManager
+    from llm_client import DEFAULT_MODEL, JSONObjectStop, LLMError, get_client
+    from prompt_budget import CHARS_PER_TOKEN, PromptSection, estimate_tokens, fit_sections, prompt_budget
+    from llm_telemetry import llm_tags
+    from llm_dispatcher import get_dispatcher
 
-DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2-uncensored:7b")
-OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434/api/generate")
+# Schema for Ollama's structured output mode, agents must return these fields
+AGENT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "agent_role": {"type": "string"},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 10},
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "weaknesses": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}},
+        "criticisms": {"type": "array", "items": {"type": "string"}},
+        "improvements": {"type": "array", "items": {"type": "string"}},
+        "enhanced_content": {"type": "string"},
+        "code_examples": {"type": "array", "items": {"type": "string"}},
+        "technical_details": {"type": "array", "items": {"type": "string"}},
+        "security_considerations": {"type": "array", "items": {"type": "string"}},
+        "rationale": {"type": "string"}
+    },
+    "required": ["confidence", "suggestions", "criticisms", "improvements", "enhanced_content"]
+}
+
+# Extra attempts for an agent whose reply fails validation
+AGENT_JSON_RETRIES = 2
+
+# Send the shared round material as a system message over /api/chat so every agent
+# call in a round starts with the same prefix and the server can reuse its KV cache
+DEBATE_USE_CHAT = os.getenv("DEBATE_USE_CHAT", "True").lower() not in ("false", "0", "no", "off")
+
+# Model tiering: critics only emit JSON critiques and can run on a small model, while
+# initial drafts and synthesis stay on the main model. OLLAMA_MODEL_<ROLE> (e.g.
+# OLLAMA_MODEL_CODE_REVIEWER) overrides a single role. A critic model that is not
+# installed falls back to the main model; set OLLAMA_CRITIC_MODEL="" to always use it.
+CRITIC_MODEL = os.getenv("OLLAMA_CRITIC_MODEL", "llama3.2:3b")
+
+# Tokens kept free after the shared round block for the per-agent persona,
+# analysis requirements and JSON instructions, and for the debate history
+AGENT_INSTRUCTION_TOKENS = 900
+AGENT_HISTORY_TOKENS = 600
+# Synthesis instructions plus the capped feedback summary
+SYNTHESIS_INSTRUCTION_TOKENS = 800
+
+# "sequential": each agent sees the feedback of the agents before it.
+# "independent": agents review in parallel without seeing each other, their
+# critiques are merged before synthesis.
+DEBATE_MODES = ("sequential", "independent")
+DEBATE_MODE = os.getenv("DEBATE_MODE", "sequential")
+
+# Debate history shown to later agents in a sequential round: points repeating an
+# earlier one (by similarity) are dropped and each agent contributes a capped number
+# of short points. DEBATE_HISTORY_CONDENSE lets the critic model condense the
+# history once it outgrows AGENT_HISTORY_TOKENS.
+HISTORY_POINTS_PER_AGENT = 3
+HISTORY_POINT_CHARS = 240
+POINT_SIMILARITY = 0.8
+DEBATE_HISTORY_CONDENSE = os.getenv("DEBATE_HISTORY_CONDENSE", "False").lower() in ("true", "1", "yes", "on")
+
+# Completed rounds are checkpointed per (technique, file) so an interrupted run
+# resumes from the last finished round instead of starting the debate over
+DEBATE_CHECKPOINTS = os.getenv("DEBATE_CHECKPOINTS", "True").lower() not in ("false", "0", "no", "off")
+DEBATE_CHECKPOINT_DIR = os.getenv("DEBATE_CHECKPOINT_DIR", "/tmp/debate_checkpoints")
+
+# An agent with no criticisms at or above this confidence is satisfied and is not
+# re-queried in later rounds, its last response counts towards consensus instead
+SATISFIED_CONFIDENCE = 7.0
 
 class AgentRole(Enum):
     """Defines the different agent roles in the debate system"""
@@ -46,6 +117,7 @@ class AgentResponse:
     criticisms: List[str]
     improvements: List[str]
     timestamp: float
+    valid: bool = True  # False when the agent never produced a usable reply
 
 @dataclass
 class DebateRound:
@@ -55,6 +127,144 @@ class DebateRound:
     responses: List[AgentResponse]
     consensus_score: float
     final_content: str
+    # Satisfied agents from earlier rounds that were not re-queried
+    carried_responses: List[AgentResponse] = field(default_factory=list)
+
+def _point_key(point) -> str:
+    return " ".join(str(point).lower().split())
+
+def is_repeat(key: str, seen: List[str], threshold: float = POINT_SIMILARITY) -> bool:
+    """Whether a normalized point says the same as one already seen"""
+    for other in seen:
+        if key == other:
+            return True
+        matcher = SequenceMatcher(None, key, other)
+        # Cheap upper bounds first, full ratio only for plausible matches
+        if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold \
+                and matcher.ratio() >= threshold:
+            return True
+    return False
+
+class DebateHistory:
+    """Compact record of earlier agents' feedback within a round
+    
+    Suggestions and criticisms are deduplicated across agents and capped per
+    agent, so each agent's prompt carries roughly constant history however
+    many agents came before it.
+    """
+    
+    def __init__(self, points_per_agent: int = HISTORY_POINTS_PER_AGENT):
+        self.points_per_agent = points_per_agent
+        self.summary = ""  # Condensed form of entries dropped by condense()
+        self.entries: List[str] = []
+        self._seen: List[str] = []
+    
+    def _new_points(self, points: List[str]) -> List[str]:
+        kept = []
+        for point in points:
+            key = _point_key(point)
+            if not key or is_repeat(key, self._seen):
+                continue
+            self._seen.append(key)
+            point = str(point).strip()
+            kept.append(point if len(point) <= HISTORY_POINT_CHARS else point[:HISTORY_POINT_CHARS] + "...")
+            if len(kept) >= self.points_per_agent:
+                break
+        return kept
+    
+    def add(self, response: AgentResponse) -> None:
+        if not response.valid:
+            return
+        criticisms = self._new_points(response.criticisms)
+        suggestions = self._new_points(response.suggestions)
+        entry = f"- {response.agent_role.value} (confidence {response.confidence})"
+        if criticisms:
+            entry += f"\n  Criticisms: {'; '.join(criticisms)}"
+        if suggestions:
+            entry += f"\n  Suggestions: {'; '.join(suggestions)}"
+        self.entries.append(entry)
+    
+    def render(self) -> str:
+        if not self.summary and not self.entries:
+            return ""
+        parts = ["PREVIOUS AGENT FEEDBACK (repeated points omitted):"]
+        if self.summary:
+            parts.append(f"Summary of earlier agents:\n{self.summary}")
+        parts.extend(self.entries)
+        return "\n".join(parts)
+    
+    def condense(self, summarize: Callable[[str], str]) -> None:
+        """Replace the entries with a summary; keeps them if summarizing fails"""
+        try:
+            summary = summarize(self.render()).strip()
+        except Exception as e:
+            print(f"[!] Could not condense debate history: {e}")
+            return
+        if summary:
+            self.summary = summary
+            self.entries = []
+
+def debate_input_hash(content: str, context: str, research_context: str = "") -> str:
+    """Hash of everything a debate starts from, a checkpoint only resumes on a match"""
+    material = json.dumps([content, context, research_context], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def _checkpoint_path(key: str) -> str:
+    return os.path.join(DEBATE_CHECKPOINT_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", key).strip("_") + ".json")
+
+def _response_from_dict(data: Dict) -> AgentResponse:
+    return AgentResponse(**dict(data, agent_role=AgentRole(data["agent_role"])))
+
+def save_checkpoint(key: str, input_hash: str, rounds: List[DebateRound]) -> None:
+    """Persist the completed rounds of a debate (atomic replace)"""
+    path = _checkpoint_path(key)
+    data = {"key": key, "input_hash": input_hash, "saved": time.time(),
+            "rounds": [asdict(debate_round) for debate_round in rounds]}
+    try:
+        os.makedirs(DEBATE_CHECKPOINT_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # AgentRole values are stored by name
+            json.dump(data, f, default=lambda o: o.value if isinstance(o, Enum) else str(o))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[!] Could not save debate checkpoint for {key}: {e}")
+
+def load_checkpoint(key: str, input_hash: str) -> List[DebateRound]:
+    """Completed rounds for a debate with the same inputs, empty if none"""
+    path = _checkpoint_path(key)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("input_hash") != input_hash:
+            print(f"[*] Debate checkpoint for {key} is for different content, starting over")
+            return []
+        return [
+            DebateRound(**dict(
+                round_data,
+                responses=[_response_from_dict(r) for r in round_data["responses"]],
+                carried_responses=[_response_from_dict(r) for r in round_data.get("carried_responses", [])]
+            ))
+            for round_data in data.get("rounds", [])
+        ]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[-] Error loading debate checkpoint for {key}: {e}")
+        return []
+
+def clear_checkpoint(key: str) -> None:
+    try:
+        os.remove(_checkpoint_path(key))
+    except OSError:
+        pass
+
+def default_role_models(model: str) -> Dict[AgentRole, str]:
+    """Per-role critic models from the environment, falling back to the main model"""
+    return {
+        role: os.getenv(f"OLLAMA_MODEL_{role.name}") or CRITIC_MODEL or model
+        for role in AgentRole
+    }
 
 class AgentDebateSystem:
     """
@@ -64,11 +274,17 @@ class AgentDebateSystem:
     generated content through structured debate rounds.
     """
     
-    def __init__(self, model: str = DEFAULT_MODEL):
-        self.model = model
+    def __init__(self, model: str = DEFAULT_MODEL, role_models: Optional[Dict[AgentRole, str]] = None):
+        self.model = model  # Drafting and synthesis
+        self.role_models = default_role_models(model)
+        self.role_models.update(role_models or {})
         self.research_manager = ResearchSummaryManager()
         self.agent_personalities = self._init_agent_personalities()
         self.debate_history: List[DebateRound] = []
+        self.use_chat = DEBATE_USE_CHAT
+        # Cleared once the server answers a format request with prose around the JSON
+        self.structured_output = True
+        self._shared_context_cache: Tuple[Tuple, str] = ((), "")
         
     def _ensure_string_list(self, items) -> List[str]:
         """Ensure all items in list are strings"""
@@ -224,8 +440,18 @@ class AgentDebateSystem:
         
         agent_info = self.agent_personalities[agent_role]
         
-        # Create agent-specific prompt with research context
-        # Create enhanced agent-specific prompt with research context
+        # Shared round material goes first, per-agent persona and instructions last
+        shared_context = self._build_shared_context(content, context, research_context)
+        
+        # Debate history gets whatever the shared block and instructions leave, newest kept
+        if debate_history:
+            history_budget = (prompt_budget(self.role_models.get(agent_role, self.model))
+                              - estimate_tokens(shared_context) - AGENT_INSTRUCTION_TOKENS)
+            debate_history = fit_sections(
+                [PromptSection("debate_history", debate_history, priority=0, keep="tail")],
+                max(history_budget, 0), label=f"{agent_role.value} history"
+            )["debate_history"]
+        
         agent_prompt = f"""
 You are {agent_info['name']}, a highly specialized AI agent with deep expertise in: {agent_info['expertise']}
 
@@ -239,16 +465,7 @@ CRITICAL QUALITY STANDARDS:
 - NO generic responses like "Thank you for your suggestions"
 - Each suggestion must be implementation-ready
 
-TASK: {agent_info['prompt_style']} for the following content with EXCEPTIONAL depth and specificity.
-
-CONTEXT:
-{context}
-
-RESEARCH CONTEXT (Authoritative information - MUST be integrated into your analysis):
-{research_context}
-
-CONTENT TO REVIEW:
-{content}
+TASK: {agent_info['prompt_style']} for the CONTENT TO REVIEW above with EXCEPTIONAL depth and specificity.
 
 {debate_history}
 
@@ -280,109 +497,221 @@ REQUIREMENTS:
 - Be critical - scores below 8.0 indicate significant issues
 - Focus on your expertise area but ensure overall quality"""
 
-        try:
-            data = {
-                "model": self.model,
-                "prompt": agent_prompt,
-                "stream": False,
-                "options": {"temperature": 0.6}
-            }
-            
-            response = requests.post(OLLAMA_URL, json=data, timeout=120)
-            response.raise_for_status()
-            
-            raw_response = response.json().get("response", "")
-            
-            # Parse JSON response
+        for attempt in range(AGENT_JSON_RETRIES + 1):
             try:
-                # Extract JSON from response
-                start_idx = raw_response.find('{')
-                end_idx = raw_response.rfind('}') + 1
-                if start_idx != -1 and end_idx != -1:
-                    json_str = raw_response[start_idx:end_idx]
-                    parsed_response = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found in response")
-                    
-            except (json.JSONDecodeError, ValueError):
-                # Fallback: create structured response from raw text
-                parsed_response = {
-                    "agent_role": agent_role.value,
-                    "confidence": 7.0,
-                    "strengths": ["Content reviewed"],
-                    "weaknesses": ["Response parsing failed"],
-                    "suggestions": ["Review response format"],
-                    "criticisms": [],
-                    "improvements": [],
-                    "enhanced_content": raw_response,
-                    "code_examples": [],
-                    "rationale": "Response parsing failed, using raw content"
-                }
+                # Structured output against the agent schema. The schema already ends the reply at the
+                # object's closing brace, so the stream is read to its final chunk and the call's
+                # telemetry comes from Ollama's metadata rather than client-side estimates. On servers
+                # without structured output _complete stops at the first JSON object instead.
+                # Only replies that validate are cached, so a malformed one is never replayed and
+                # the first good retry is stored under the same key.
+                with llm_tags(stage="critique", role=agent_role.value):
+                    raw_response = self._complete(
+                        shared_context, agent_prompt, model=self._model_for(agent_role), options={"temperature": 0.6},
+                        format=AGENT_RESPONSE_SCHEMA, validate=self._parse_agent_json
+                    )
+                parsed_response = self._parse_agent_json(raw_response)
+            except ValueError as e:
+                print(f"[!] Malformed response from {agent_role.value} ({e}), "
+                      f"retrying ({attempt + 1}/{AGENT_JSON_RETRIES})" if attempt < AGENT_JSON_RETRIES
+                      else f"[-] Malformed response from {agent_role.value} ({e}), excluding agent")
+                continue
+            except LLMError as e:
+                print(f"[-] Error generating response for {agent_role.value}: {e}")
+                break
             
             return AgentResponse(
                 agent_role=agent_role,
-                content=parsed_response.get("enhanced_content", content),
+                content=parsed_response.get("enhanced_content") or content,
                 confidence=self._parse_confidence(parsed_response.get("confidence", 5.0)),
                 suggestions=self._ensure_string_list(parsed_response.get("suggestions", [])),
                 criticisms=self._ensure_string_list(parsed_response.get("criticisms", [])),
                 improvements=self._ensure_string_list(parsed_response.get("improvements", [])),
                 timestamp=time.time()
             )
-            
-        except Exception as e:
-            print(f"[-] Error generating response for {agent_role.value}: {e}")
-            # Return fallback response
-            return AgentResponse(
-                agent_role=agent_role,
-                content=content,
-                confidence=5.0,
-                suggestions=[f"Error in {agent_role.value} analysis"],
-                criticisms=[],
-                improvements=[],
-                timestamp=time.time()
-            )
+        
+        # No usable reply: mark invalid so it is left out of consensus and synthesis
+        return AgentResponse(
+            agent_role=agent_role,
+            content=content,
+            confidence=0.0,
+            suggestions=[],
+            criticisms=[],
+            improvements=[],
+            timestamp=time.time(),
+            valid=False
+        )
+    
+    def _build_shared_context(self, content: str, context: str, research_context: str = "") -> str:
+        """Material common to every call in a round, byte-identical across agents
+        
+        Research is trimmed before the content under review when the block would
+        not leave room for the instructions within the model's context window.
+        """
+        key = (content, context, research_context)
+        # Read the slot once, concurrent debates on this instance may replace it meanwhile
+        cached_key, cached = self._shared_context_cache
+        if cached_key == key:
+            return cached
+        
+        header = f"""You are part of a panel of expert agents reviewing and improving security documentation.
+
+CONTEXT:
+{context}"""
+        fitted = fit_sections([
+            PromptSection("header", header),
+            PromptSection("research_context", research_context, priority=0),
+            PromptSection("content", content, priority=1, min_tokens=256),
+        ], prompt_budget(self._budget_model()) - AGENT_INSTRUCTION_TOKENS - AGENT_HISTORY_TOKENS,
+           label="debate round context")
+        
+        shared_context = f"""{header}
+
+RESEARCH CONTEXT (Authoritative information - MUST be integrated into your analysis):
+{fitted["research_context"]}
+
+CONTENT TO REVIEW:
+{fitted["content"]}"""
+        self._shared_context_cache = (key, shared_context)
+        return shared_context
+    
+    def _model_for(self, agent_role: AgentRole) -> str:
+        """Model serving a role, the main model if the configured one is not installed"""
+        return get_client().resolve_model(self.role_models.get(agent_role, self.model), fallback=self.model)
+    
+    def _budget_model(self) -> str:
+        """Model with the smallest prompt budget among those a round uses
+        
+        The shared round block must be identical for every call, so it is sized
+        for the tightest window.
+        """
+        models = {self.model} | set(self.role_models.values())
+        return min(models, key=prompt_budget)
+    
+    def _complete(self, shared_context: str, instructions: str, model: Optional[str] = None, **kwargs) -> str:
+        """Run one call with the shared round material as its prefix
+        
+        Uses a chat session (shared system message) when the server supports it,
+        otherwise a single prompt with the shared block first. Servers without
+        structured output (no /api/chat, or `format` seen ignored) get a
+        JSONObjectStop so reading ends at the first complete JSON object.
+        """
+        client = get_client()
+        model = model or self.model
+        if "format" in kwargs and "stop" not in kwargs and not (self.use_chat and self.structured_output):
+            kwargs["stop"] = JSONObjectStop()
+        if self.use_chat:
+            messages = [
+                {"role": "system", "content": shared_context},
+                {"role": "user", "content": instructions}
+            ]
+            try:
+                return client.chat(messages, model=model, **kwargs)
+            except LLMError as e:
+                if "404" not in str(e):
+                    raise
+                print(f"[!] Server has no /api/chat, falling back to prefix-ordered prompts")
+                self.use_chat = False
+                if "format" in kwargs and "stop" not in kwargs:
+                    kwargs["stop"] = JSONObjectStop()
+        return client.generate(f"{shared_context}\n\n{instructions}", model=model, **kwargs)
+    
+    def _parse_agent_json(self, raw_response: str) -> Dict:
+        """Parse and validate an agent reply against AGENT_RESPONSE_SCHEMA, raises ValueError"""
+        try:
+            parsed = json.loads(raw_response)
+        except json.JSONDecodeError:
+            # Servers without structured output may still wrap the object in prose
+            if self.structured_output:
+                print(f"[!] Server ignored the response format, stopping agent replies at the first JSON object")
+                self.structured_output = False
+            start_idx = raw_response.find('{')
+            end_idx = raw_response.rfind('}') + 1
+            if start_idx == -1 or end_idx == 0:
+                raise ValueError("no JSON object in response")
+            parsed = json.loads(raw_response[start_idx:end_idx])
+        
+        if not isinstance(parsed, dict):
+            raise ValueError("response is not a JSON object")
+        missing = [field for field in AGENT_RESPONSE_SCHEMA["required"] if field not in parsed]
+        if missing:
+            raise ValueError(f"missing fields: {', '.join(missing)}")
+        
+        confidence = parsed["confidence"]
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 10:
+            raise ValueError(f"invalid confidence: {confidence!r}")
+        if not isinstance(parsed["enhanced_content"], str):
+            raise ValueError("enhanced_content is not a string")
+        for field in ("suggestions", "criticisms", "improvements"):
+            if not isinstance(parsed[field], list):
+                raise ValueError(f"{field} is not a list")
+        
+        return parsed
     
     def conduct_debate_round(self, content: str, context: str, 
                            agents: Optional[List[AgentRole]] = None, 
                            round_number: int = 1, 
-                           research_context: str = "") -> DebateRound:
-        """Conduct a single round of debate between agents"""
+                           research_context: str = "",
+                           mode: Optional[str] = None,
+                           carried_responses: Optional[List[AgentResponse]] = None) -> DebateRound:
+        """Conduct a single round of debate between agents
+        
+        mode is "sequential" (agents build on each other's feedback) or
+        "independent" (all agents review concurrently), DEBATE_MODE by default.
+        carried_responses from agents not re-queried count towards consensus
+        but not towards synthesis.
+        """
         
         if agents is None:
             agents = list(AgentRole)
+        mode = mode or DEBATE_MODE
+        if mode not in DEBATE_MODES:
+            raise ValueError(f"Unknown debate mode: {mode} (expected one of {', '.join(DEBATE_MODES)})")
         
-        print(f"[*] Starting debate round {round_number} with {len(agents)} agents")
-        
-        responses = []
-        debate_history = ""
+        print(f"[*] Starting debate round {round_number} with {len(agents)} agents ({mode})")
         
-        # Generate responses from each agent
-        for agent_role in agents:
-            print(f"[*] Getting response from {self.agent_personalities[agent_role]['name']}")
+        if mode == "independent":
+            # No agent depends on another's reply, so the whole round is in flight at once
+            dispatcher = get_dispatcher()
+            futures = []
+            for agent_role in agents:
+                print(f"[*] Getting response from {self.agent_personalities[agent_role]['name']}")
+                futures.append(dispatcher.submit(
+                    self._generate_agent_response, agent_role, content, context, "", research_context
+                ))
+            responses = [future.result() for future in futures]
+        else:
+            responses = []
+            debate_history = DebateHistory()
             
-            response = self._generate_agent_response(
-                agent_role, content, context, debate_history, research_context
-            )
-            responses.append(response)
-            
-            # Build debate history for subsequent agents
-            debate_history += f"\n\nPREVIOUS AGENT FEEDBACK ({agent_role.value}):\n"
-            debate_history += f"Confidence: {response.confidence}\n"
-            debate_history += f"Suggestions: {'; '.join(response.suggestions)}\n"
-            debate_history += f"Criticisms: {'; '.join(response.criticisms)}\n"
+            # Generate responses from each agent
+            for agent_role in agents:
+                print(f"[*] Getting response from {self.agent_personalities[agent_role]['name']}")
+                
+                response = self._generate_agent_response(
+                    agent_role, content, context, debate_history.render(), research_context
+                )
+                responses.append(response)
+                
+                # Compact history for subsequent agents
+                debate_history.add(response)
+                if DEBATE_HISTORY_CONDENSE and estimate_tokens(debate_history.render()) > AGENT_HISTORY_TOKENS:
+                    debate_history.condense(self._condense_history)
         
         # Calculate consensus score
-        consensus_score = self._calculate_consensus(responses)
+        carried_responses = carried_responses or []
+        consensus_score = self._calculate_consensus(responses + carried_responses)
         
         # Generate final content based on all agent feedback
-        final_content = self._synthesize_final_content(content, responses, context)
+        final_content = self._synthesize_final_content(content, responses, context, research_context)
         
         debate_round = DebateRound(
             round_number=round_number,
             topic=context,
             responses=responses,
             consensus_score=consensus_score,
-            final_content=final_content
+            final_content=final_content,
+            carried_responses=carried_responses
         )
         
         self.debate_history.append(debate_round)
@@ -393,6 +722,8 @@ REQUIREMENTS:
     
     def _calculate_consensus(self, responses: List[AgentResponse]) -> float:
         """Calculate consensus score based on agent responses"""
+        # Agents without a usable reply carry no signal, leave them out
+        responses = [r for r in responses if r.valid]
         if not responses:
             return 0.0
         
@@ -407,32 +738,62 @@ REQUIREMENTS:
         consensus = max(0, avg_confidence - criticism_penalty)
         return consensus
     
+    def _merge_feedback(self, responses: List[AgentResponse]) -> Tuple[List[str], List[str], List[str]]:
+        """Suggestions, improvements and criticisms across agents, repeats removed
+        
+        Agents reviewing independently often raise the same point, it is kept once.
+        """
+        merged: Tuple[List[str], List[str], List[str]] = ([], [], [])
+        seen: Tuple[List[str], List[str], List[str]] = ([], [], [])
+        for response in responses:
+            if not response.valid:
+                continue
+            for items, out, keys in zip((response.suggestions, response.improvements, response.criticisms),
+                                        merged, seen):
+                for item in items:
+                    key = _point_key(item)
+                    if key and not is_repeat(key, keys):
+                        keys.append(key)
+                        out.append(item)
+        return merged
+    
+    def _condense_history(self, history: str) -> str:
+        """Condense debate history into a few distinct points on the critic model"""
+        prompt = f"""Condense the reviewer feedback below into at most 8 distinct, concrete bullet points.
+Keep technical specifics (event IDs, commands, tools), drop repeats and filler. Output only the bullets.
+
+{history}"""
+        model = get_client().resolve_model(CRITIC_MODEL or self.model, fallback=self.model)
+        with llm_tags(stage="history"):
+            summary = get_client().generate(prompt, model=model, options={"temperature": 0.2})
+        max_chars = int(AGENT_HISTORY_TOKENS * CHARS_PER_TOKEN)
+        return summary[:max_chars]
+    
     def _synthesize_final_content(self, original_content: str, 
                                 responses: List[AgentResponse], 
-                                context: str) -> str:
+                                context: str, research_context: str = "") -> str:
         """Synthesize final content based on all agent feedback"""
         
         # Collect all suggestions and improvements
-        all_suggestions = []
-        all_improvements = []
-        all_criticisms = []
-        enhanced_contents = []
+        all_suggestions, all_improvements, all_criticisms = self._merge_feedback(responses)
+        enhanced_contents = [
+            response.content for response in responses
+            if response.valid and response.content and response.content != original_content
+        ]
         
-        for response in responses:
-            all_suggestions.extend(response.suggestions)
-            all_improvements.extend(response.improvements)
-            all_criticisms.extend(response.criticisms)
-            if response.content and response.content != original_content:
-                enhanced_contents.append(response.content)
+        # Create synthesis prompt, after the same shared block the agents saw this round
+        shared_context = self._build_shared_context(original_content, context, research_context)
+        
+        # Agents' rewrites are the largest part of the synthesis prompt, trim them to the window
+        enhanced_versions = chr(10).join(content for content in enhanced_contents[:3] if content)
+        enhanced_versions = fit_sections(
+            [PromptSection("enhanced_versions", enhanced_versions, priority=0)],
+            max(prompt_budget(self.model) - estimate_tokens(shared_context) - SYNTHESIS_INSTRUCTION_TOKENS, 0),
+            label="synthesis"
+        )["enhanced_versions"]
         
-        # Create synthesis prompt
         synthesis_prompt = f"""
-You are a content synthesis specialist. Your job is to create the highest quality final content by incorporating feedback from multiple expert agents.
-
-ORIGINAL CONTENT:
-{original_content}
-
-CONTEXT: {context}
+You are a content synthesis specialist. Your job is to create the highest quality final version of the CONTENT TO REVIEW above by incorporating feedback from multiple expert agents.
 
 AGENT FEEDBACK SUMMARY:
 Suggestions: {'; '.join(all_suggestions[:10])}  # Limit to top 10
@@ -440,7 +801,7 @@ Improvements: {'; '.join(all_improvements[:10])}
 Critical Issues: {'; '.join(all_criticisms[:5])}
 
 ENHANCED VERSIONS FROM AGENTS:
-{chr(10).join(content for content in enhanced_contents[:3] if content)}  # Top 3 enhanced versions
+{enhanced_versions}  # Top 3 enhanced versions
 
 TASK: Create the final, highest-quality version that:
 1. Addresses all critical issues
@@ -453,18 +814,10 @@ Focus on technical depth, practical examples, and actionable content.
 """
 
         try:
-            data = {
-                "model": self.model,
-                "prompt": synthesis_prompt,
-                "stream": False,
-                "options": {"temperature": 0.4}  # Lower temperature for consistency
-            }
-            
-            response = requests.post(OLLAMA_URL, json=data, timeout=180)
-            response.raise_for_status()
-            
-            final_content = response.json().get("response", original_content)
-            return final_content
+            # Lower temperature for consistency
+            with llm_tags(stage="synthesis"):
+                final_content = self._complete(shared_context, synthesis_prompt, options={"temperature": 0.4})
+            return final_content or original_content
             
         except Exception as e:
             print(f"[-] Error in content synthesis: {e}")
@@ -476,32 +829,56 @@ Focus on technical depth, practical examples, and actionable content.
     def multi_round_debate(self, content: str, context: str, 
                           max_rounds: int = 3, 
                           consensus_threshold: float = 8.0,
-                          research_context: str = "") -> str:
+                          research_context: str = "",
+                          mode: Optional[str] = None,
+                          min_rounds: int = 2,
+                          checkpoint_key: Optional[str] = None) -> str:
         """
         Conduct multiple rounds of debate until consensus or max rounds reached
         
         Enhanced with:
         - Higher quality threshold (8.0 instead of 7.5)
-        - Minimum 2 rounds for thorough review
+        - Minimum rounds (2 by default) for thorough review
         - Better progression tracking
         - Quality improvement monitoring
+        
+        With a checkpoint_key (e.g. "T1059/detection.md") every completed round
+        is saved, and a rerun with the same inputs resumes after the last one.
         """
         
         print(f"[*] Starting multi-round debate (max {max_rounds} rounds, threshold {consensus_threshold})")
         
         current_content = content
-        min_rounds = 2  # Force minimum 2 rounds for quality
+        agents: Optional[List[AgentRole]] = None
+        carried: List[AgentResponse] = []
+        prev_score = None
+        
+        checkpoint_key = checkpoint_key if DEBATE_CHECKPOINTS else None
+        input_hash = debate_input_hash(content, context, research_context)
+        completed = load_checkpoint(checkpoint_key, input_hash) if checkpoint_key else []
+        if completed:
+            print(f"[*] Resuming debate for {checkpoint_key} after round {len(completed)} from checkpoint")
+        rounds: List[DebateRound] = []
         
         for round_num in range(1, max_rounds + 1):
-            debate_round = self.conduct_debate_round(
-                current_content, context, round_number=round_num, research_context=research_context
-            )
+            if round_num <= len(completed):
+                # Replay the checkpointed round so the round logic below picks up where it stopped
+                debate_round = completed[round_num - 1]
+                self.debate_history.append(debate_round)
+            else:
+                debate_round = self.conduct_debate_round(
+                    current_content, context, agents=agents, round_number=round_num,
+                    research_context=research_context, mode=mode, carried_responses=carried
+                )
+            rounds.append(debate_round)
+            if checkpoint_key and round_num > len(completed):
+                save_checkpoint(checkpoint_key, input_hash, rounds)
             
             # Track quality progression
-            if round_num > 1 and self.debate_history:
-                prev_score = self.debate_history[-1].consensus_score
+            if prev_score is not None:
                 improvement = debate_round.consensus_score - prev_score
                 print(f"[*] Quality improvement: {improvement:+.2f}")
+            prev_score = debate_round.consensus_score
             
             current_content = debate_round.final_content
             
@@ -520,19 +897,30 @@ Focus on technical depth, practical examples, and actionable content.
             else:
                 print(f"[*] Minimum rounds not reached ({round_num}/{min_rounds})")
             
-            # For subsequent rounds, focus on agents that had the most criticisms
+            # Subsequent rounds only re-query dissenting agents (criticisms, low confidence
+            # or no usable reply), satisfied agents' last responses are carried forward
             if round_num < max_rounds:
+                latest = debate_round.responses + debate_round.carried_responses
                 critical_agents = [
-                    r.agent_role for r in debate_round.responses 
-                    if len(r.criticisms) > 0 or r.confidence < 7.0
+                    r.agent_role for r in latest
+                    if not r.valid or len(r.criticisms) > 0 or r.confidence < SATISFIED_CONFIDENCE
                 ]
                 
-                if critical_agents and round_num >= min_rounds:
-                    print(f"[*] Next round will focus on: {[a.value for a in critical_agents]}")
-                    # Continue with critical agents for next round
-                elif round_num >= min_rounds and not critical_agents:
+                if critical_agents:
+                    agents = critical_agents
+                    carried = [r for r in latest if r.agent_role not in critical_agents]
+                    print(f"[*] Next round re-queries: {[a.value for a in critical_agents]} "
+                          f"({len(carried)} satisfied agents carried forward)")
+                elif round_num >= min_rounds:
                     print(f"[+] No major criticisms after minimum rounds, ending debate")
                     break
+                else:
+                    # Everyone is satisfied before the minimum rounds, review the revision in full
+                    agents = None
+                    carried = []
+        
+        if checkpoint_key:
+            clear_checkpoint(checkpoint_key)
         
         # Validate final quality
         final_score = self.debate_history[-1].consensus_score if self.debate_history else 0
@@ -554,11 +942,15 @@ Focus on technical depth, practical examples, and actionable content.
         }
         
         for round_info in self.debate_history:
+            valid_responses = [r for r in round_info.responses if r.valid]
             round_summary = {
                 "round": round_info.round_number,
                 "consensus": round_info.consensus_score,
                 "agent_count": len(round_info.responses),
-                "avg_confidence": sum(r.confidence for r in round_info.responses) / len(round_info.responses),
+                "failed_agents": [r.agent_role.value for r in round_info.responses if not r.valid],
+                "carried_agents": [r.agent_role.value for r in round_info.carried_responses],
+                "avg_confidence": (sum(r.confidence for r in valid_responses) / len(valid_responses)
+                                   if valid_responses else 0.0),
                 "total_suggestions": sum(len(r.suggestions) for r in round_info.responses),
                 "total_criticisms": sum(len(r.criticisms) for r in round_info.responses)
             }
@@ -570,7 +962,10 @@ def enhanced_generation_with_debate(prompt: str, context: str,
                                   model: str = DEFAULT_MODEL,
                                   max_debate_rounds: int = 2,
                                   consensus_threshold: float = 7.5,
-                                  research_context: str = "") -> Tuple[str, Dict]:
+                                  research_context: str = "",
+                                  mode: Optional[str] = None,
+                                  pre_gate: Optional[Callable[[str], str]] = None,
+                                  checkpoint_key: Optional[str] = None) -> Tuple[str, Dict]:
     """
     Enhanced content generation using agent debate system
     
@@ -581,6 +976,11 @@ def enhanced_generation_with_debate(prompt: str, context: str,
         max_debate_rounds: Maximum number of debate rounds
         consensus_threshold: Consensus score threshold to stop early
         research_context: Research context from external sources
+        mode: Debate round mode, "sequential" or "independent" (DEBATE_MODE by default)
+        pre_gate: Called with the initial draft, returns "skip" (no debate),
+            "abbreviated" (a single round) or "full"
+        checkpoint_key: Checkpoint completed debate rounds under this key
+            (e.g. "T1059/detection.md") and resume from them
     
     Returns:
         Tuple of (final_content, debate_summary)
@@ -593,16 +993,8 @@ def enhanced_generation_with_debate(prompt: str, context: str,
     # Step 1: Initial content generation
     print(f"[*] Generating initial content...")
     try:
-        data = {
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {"temperature": 0.7}
-        }
-        
-        response = requests.post(OLLAMA_URL, json=data, timeout=180)
-        response.raise_for_status()
-        initial_content = response.json().get("response", "")
+        with llm_tags(stage="draft"):
+            initial_content = get_client().generate(prompt, model=model, options={"temperature": 0.7})
         
         if not initial_content:
             return "Error: No initial content generated", {}
@@ -613,6 +1005,15 @@ def enhanced_generation_with_debate(prompt: str, context: str,
     
     print(f"[+] Initial content generated ({len(initial_content)} chars)")
     
+    # Drafts that already clear the local quality bars skip or shorten the debate
+    decision = pre_gate(initial_content) if pre_gate else "full"
+    if decision == "skip":
+        print(f"[+] Initial draft passed the pre-gate, skipping debate")
+        return initial_content, {"pre_gate": decision, "total_rounds": 0}
+    min_rounds = 2
+    if decision == "abbreviated":
+        max_debate_rounds = min_rounds = 1
+    
     # Step 2: Agent debate and refinement
     debate_system = AgentDebateSystem(model)
     
@@ -621,11 +1022,15 @@ def enhanced_generation_with_debate(prompt: str, context: str,
         context, 
         max_rounds=max_debate_rounds,
         consensus_threshold=consensus_threshold,
-        research_context=research_context
+        research_context=research_context,
+        mode=mode,
+        min_rounds=min_rounds,
+        checkpoint_key=checkpoint_key
     )
     
     # Get debate summary
     debate_summary = debate_system.get_debate_summary()
+    debate_summary["pre_gate"] = decision
     
     print(f"[+] Enhanced generation complete")
     print(f"[+] Content improvement: {len(initial_content)} -> {len(final_content)} chars")
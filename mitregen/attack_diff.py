@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+ATT&CK release diff for incremental regeneration.
+Compares two cached bundle versions and marks only the affected knowledge
+base entries as stale in the status files.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Add current directory to path for relative imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from .attack_store import AttackStore, get_attack_store, previous_path, DEFAULT_DOMAIN, ATTACK_DOMAINS
+    from .enhanced_research import MITREResearcher
+except ImportError:
+    from attack_store import AttackStore, get_attack_store, previous_path, DEFAULT_DOMAIN, ATTACK_DOMAINS
+    from enhanced_research import MITREResearcher
+
+# Technique fields that feed the generated content
+CONTENT_FIELDS = ("name", "description", "x_mitre_platforms", "kill_chain_phases")
+
+# Status files and the field that links their entries to ATT&CK IDs
+STATUS_FILES = {
+    "project_status.json": ("techniques", None),
+    "security_methods.json": ("methods", "mitre_mappings"),
+}
+
+STALE_STATUS = "stale"
+
+def technique_hash(store: AttackStore, technique: Dict) -> str:
+    """Hash of a technique's content and of the relationships the context builders read"""
+    related = []
+    for rel_type, rels in store.relations_in.get(technique.get("id"), {}).items():
+        for rel in rels:
+            related.append([rel_type, rel.get("source_ref"), rel.get("description", "")])
+    payload = {
+        "fields": {k: technique.get(k) for k in CONTENT_FIELDS},
+        "related": sorted(related),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _techniques_by_id(store: AttackStore) -> Dict[str, Dict]:
+    techniques = {}
+    for obj in store.get_objects_by_type("attack-pattern"):
+        external_id = AttackStore.get_external_id(obj)
+        if external_id:
+            techniques[external_id] = store.get_technique(external_id) or obj
+    return techniques
+
+def diff_stores(old: AttackStore, new: AttackStore) -> Dict[str, List[str]]:
+    """Technique IDs added, modified, revoked, deprecated or removed between two versions
+
+    A technique counts as modified only when its content hash changed; the
+    STIX `modified` timestamp is used to skip hashing unchanged objects.
+    """
+    old_techniques = _techniques_by_id(old)
+    new_techniques = _techniques_by_id(new)
+    diff = {"added": [], "modified": [], "revoked": [], "deprecated": [], "removed": []}
+
+    for technique_id, new_obj in new_techniques.items():
+        old_obj = old_techniques.get(technique_id)
+        if old_obj is None:
+            if not new_obj.get("revoked") and not new_obj.get("x_mitre_deprecated"):
+                diff["added"].append(technique_id)
+            continue
+
+        if new_obj.get("revoked") and not old_obj.get("revoked"):
+            diff["revoked"].append(technique_id)
+        elif new_obj.get("x_mitre_deprecated") and not old_obj.get("x_mitre_deprecated"):
+            diff["deprecated"].append(technique_id)
+        elif new_obj.get("revoked") or new_obj.get("x_mitre_deprecated"):
+            continue
+        elif (new_obj.get("modified") != old_obj.get("modified")
+              or new.relations_in.get(new_obj.get("id")) != old.relations_in.get(old_obj.get("id"))):
+            if technique_hash(new, new_obj) != technique_hash(old, old_obj):
+                diff["modified"].append(technique_id)
+
+    diff["removed"] = [t for t in old_techniques if t not in new_techniques]
+
+    for key in diff:
+        diff[key].sort()
+    return diff
+
+def affected_ids(diff: Dict[str, List[str]]) -> Dict[str, str]:
+    """Map each affected technique ID to the reason it is stale
+
+    Parents of added or changed sub-techniques are included because their
+    description lists the sub-techniques.
+    """
+    reasons = {}
+    for reason in ("modified", "revoked", "deprecated", "removed", "added"):
+        for technique_id in diff.get(reason, []):
+            reasons.setdefault(technique_id, reason)
+            if "." in technique_id and reason in ("added", "revoked", "deprecated", "removed"):
+                reasons.setdefault(technique_id.split('.')[0], "sub_techniques_changed")
+    return reasons
+
+def mark_stale(status_file: str, reasons: Dict[str, str], dry_run: bool = False) -> List[str]:
+    """Set status to stale for entries affected by the diff; returns the marked entry IDs"""
+    if not os.path.exists(status_file) or not reasons:
+        return []
+
+    list_key, mapping_key = STATUS_FILES.get(os.path.basename(status_file), ("techniques", None))
+    with open(status_file, 'r') as f:
+        status = json.load(f)
+
+    marked = []
+    for entry in status.get(list_key, []):
+        if mapping_key:
+            hits = [m for m in entry.get(mapping_key, []) if m in reasons]
+            reason = f"mapped ATT&CK technique {hits[0]} {reasons[hits[0]]}" if hits else None
+        else:
+            reason = reasons.get(entry.get("id"))
+        if not reason:
+            continue
+        marked.append(entry["id"])
+        if not dry_run:
+            # Remember the status to restore once the entry is regenerated
+            if entry.get("status") != STALE_STATUS:
+                entry["stale_previous_status"] = entry.get("status", "pending")
+            entry["status"] = STALE_STATUS
+            entry["stale_reason"] = reason
+
+    if marked and not dry_run:
+        status["last_updated"] = datetime.now().isoformat()
+        with open(status_file, 'w') as f:
+            json.dump(status, f, indent=2)
+
+    return marked
+
+def clear_stale(technique_id: str, status_files: Iterable[str] = tuple(STATUS_FILES)):
+    """Restore a regenerated entry from stale to its status before it was marked"""
+    for status_file in status_files:
+        if not os.path.exists(status_file):
+            continue
+        list_key, _ = STATUS_FILES.get(os.path.basename(status_file), ("techniques", None))
+        try:
+            with open(status_file, 'r') as f:
+                status = json.load(f)
+        except Exception as e:
+            print(f"[-] Error loading {status_file}: {e}")
+            continue
+
+        changed = False
+        for entry in status.get(list_key, []):
+            if entry.get("id") == technique_id and entry.get("status") == STALE_STATUS:
+                entry["status"] = entry.pop("stale_previous_status", "pending")
+                entry.pop("stale_reason", None)
+                changed = True
+        if changed:
+            with open(status_file, 'w') as f:
+                json.dump(status, f, indent=2)
+
+def diff_cached_versions(researcher: Optional[MITREResearcher] = None,
+                         domain: str = DEFAULT_DOMAIN) -> Optional[Dict[str, List[str]]]:
+    """Diff the current cached bundle of a domain against the snapshot kept at its last refresh"""
+    researcher = researcher or MITREResearcher()
+    new_store = researcher.get_store(domain)
+    old_file = previous_path(researcher.get_cache_file(domain))
+    if not os.path.exists(old_file):
+        print(f"[!] No previous {domain} snapshot at {old_file}; nothing to diff")
+        return None
+    return diff_stores(get_attack_store(old_file), new_store)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Diff two ATT&CK bundle versions and mark affected entries stale",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Diff the cached bundle against the snapshot kept at its last refresh
+  python3 attack_diff.py
+
+  # Diff two explicit bundle files without touching status files
+  python3 attack_diff.py --old v16.json --new v17.json --dry-run
+        """
+    )
+    parser.add_argument('--old', help='Older bundle file (default: cached previous snapshot)')
+    parser.add_argument('--new', help='Newer bundle file (default: current cached bundle)')
+    parser.add_argument('--domain', choices=ATTACK_DOMAINS, default=DEFAULT_DOMAIN,
+                        help='ATT&CK domain of the cached bundles')
+    parser.add_argument('--status', nargs='+', default=list(STATUS_FILES),
+                        help='Status files to mark stale entries in')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report affected entries without writing status files')
+    args = parser.parse_args()
+
+    if args.old and args.new:
+        diff = diff_stores(get_attack_store(args.old), get_attack_store(args.new))
+    elif args.old or args.new:
+        parser.error("--old and --new must be given together")
+    else:
+        diff = diff_cached_versions(domain=args.domain)
+        if diff is None:
+            return
+
+    print("[*] ATT&CK diff:")
+    for key, ids in diff.items():
+        print(f"    - {key}: {len(ids)}" + (f" ({', '.join(ids[:10])}{'...' if len(ids) > 10 else ''})" if ids else ""))
+
+    reasons = affected_ids(diff)
+    for status_file in args.status:
+        marked = mark_stale(status_file, reasons, dry_run=args.dry_run)
+        action = "Would mark" if args.dry_run else "Marked"
+        print(f"[+] {action} {len(marked)} entries stale in {status_file}")
+
+if __name__ == "__main__":
+    main()
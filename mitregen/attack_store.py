@@ -0,0 +1,358 @@
+"""
+Indexed in-memory store for MITRE ATT&CK STIX bundles.
+Parses a bundle once per process and serves constant-time lookups by
+ATT&CK ID, STIX ID, object type and parent technique.
+"""
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Source names used by the ATT&CK domains for their own external IDs
+ATTACK_SOURCE_NAMES = ("mitre-attack", "mitre-mobile-attack", "mitre-ics-attack")
+
+# ATT&CK domains published in the MITRE CTI repository, in lookup order
+ATTACK_DOMAINS = ("enterprise-attack", "mobile-attack", "ics-attack")
+DEFAULT_DOMAIN = "enterprise-attack"
+
+# Bump when the compiled layout or COMPACT_FIELDS change
+COMPILED_FORMAT_VERSION = 4
+
+# Fields kept in the compiled index; everything else in the bundle is dropped
+COMPACT_FIELDS = (
+    "id", "type", "name", "description", "aliases", "modified", "revoked",
+    "x_mitre_deprecated", "x_mitre_platforms", "x_mitre_is_subtechnique",
+    "x_mitre_data_source_ref", "x_mitre_domains", "kill_chain_phases",
+    "relationship_type", "source_ref", "target_ref",
+)
+
+def compact_object(obj: Dict) -> Dict:
+    """Strip a STIX object down to the fields the context builders use"""
+    compact = {k: obj[k] for k in COMPACT_FIELDS if k in obj}
+    refs = [
+        {k: ref[k] for k in ("source_name", "external_id", "url") if k in ref}
+        for ref in obj.get("external_references", [])
+        if ref.get("source_name") in ATTACK_SOURCE_NAMES
+    ]
+    if refs:
+        compact["external_references"] = refs
+    return compact
+
+def domains_for_id(external_id: str) -> Tuple[str, ...]:
+    """Domains to search for an ATT&CK ID, most likely first
+
+    ICS techniques use the T08xx range; everything else is tried in
+    enterprise first so enterprise-only runs never load the other bundles.
+    """
+    if external_id.startswith("T08"):
+        return ("ics-attack",) + tuple(d for d in ATTACK_DOMAINS if d != "ics-attack")
+    return ATTACK_DOMAINS
+
+def meta_path(path: str) -> str:
+    """Sidecar file holding HTTP metadata (ETag, Last-Modified) of a cached bundle"""
+    return f"{path}.meta"
+
+def compiled_path(path: str) -> str:
+    """Location of the compiled index for a bundle"""
+    return f"{path}.idx.pickle"
+
+def previous_path(path: str) -> str:
+    """Location of the snapshot kept of a bundle before it is refreshed"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.previous{ext}"
+
+def snapshot_previous(path: str):
+    """Keep the current bundle (with its metadata and index) as the previous version"""
+    previous = previous_path(path)
+    for src, dst in ((path, previous),
+                     (meta_path(path), meta_path(previous)),
+                     (compiled_path(path), compiled_path(previous))):
+        if os.path.exists(dst):
+            os.remove(dst)
+        if not os.path.exists(src):
+            continue
+        try:
+            # Hard link keeps the old inode alive after the bundle is replaced
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+def read_meta(path: str) -> Dict:
+    try:
+        with open(meta_path(path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_meta(path: str, meta: Dict):
+    """Atomically replace the metadata sidecar of a cached bundle"""
+    tmp_path = f"{meta_path(path)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path(path))
+
+def source_fingerprint(path: str) -> Dict:
+    """Identify a bundle version by file stat and upstream ETag"""
+    stat = os.stat(path)
+    return {
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "etag": read_meta(path).get("etag"),
+    }
+
+class AttackStore:
+    """Indexes over the objects of a single STIX bundle"""
+
+    def __init__(self, objects: List[Dict]):
+        self.by_stix_id: Dict[str, Dict] = {}
+        self.by_external_id: Dict[str, Dict] = {}
+        self.by_type: Dict[str, List[Dict]] = {}
+        self.subtechniques: Dict[str, List[str]] = {}
+        self.revoked_by: Dict[str, str] = {}
+        # Adjacency over relationship objects: stix_id -> relationship_type -> [relationship]
+        self.relations_in: Dict[str, Dict[str, List[Dict]]] = {}
+        self.relations_out: Dict[str, Dict[str, List[Dict]]] = {}
+        self._index(objects)
+
+    @classmethod
+    def from_file(cls, path: str) -> "AttackStore":
+        """Parse a bundle file and build the indexes"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data.get("objects", []))
+
+    @classmethod
+    def load_compiled(cls, path: str) -> Optional["AttackStore"]:
+        """Load the compiled index for a bundle if it matches the bundle on disk"""
+        index_file = compiled_path(path)
+        try:
+            # Only trust an index written by this user; /tmp is shared
+            if os.stat(index_file).st_uid != os.getuid():
+                return None
+            with open(index_file, 'rb') as f:
+                payload = pickle.load(f)
+        except Exception:
+            return None
+
+        if payload.get("format") != COMPILED_FORMAT_VERSION:
+            return None
+        if payload.get("source") != source_fingerprint(path):
+            return None
+
+        store = cls.__new__(cls)
+        store.__dict__.update(payload["indexes"])
+        return store
+
+    @classmethod
+    def compile(cls, path: str) -> "AttackStore":
+        """Parse a bundle, keep only compact objects and write the index next to it"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        store = cls([compact_object(obj) for obj in data.get("objects", [])])
+        del data
+
+        payload = {
+            "format": COMPILED_FORMAT_VERSION,
+            "source": source_fingerprint(path),
+            "indexes": store.__dict__,
+        }
+        index_file = compiled_path(path)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_file) or ".", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, index_file)
+        except OSError as e:
+            print(f"[-] Could not write compiled ATT&CK index {index_file}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return store
+
+    @staticmethod
+    def get_external_id(obj: Dict) -> Optional[str]:
+        """Return the ATT&CK ID (T1059, M1036, G0007...) of a STIX object"""
+        for ref in obj.get("external_references", []):
+            if ref.get("source_name") in ATTACK_SOURCE_NAMES and ref.get("external_id"):
+                return ref["external_id"]
+        return None
+
+    def _index(self, objects: List[Dict]):
+        relationships = []
+
+        for obj in objects:
+            stix_id = obj.get("id")
+            obj_type = obj.get("type", "")
+            if stix_id:
+                self.by_stix_id[stix_id] = obj
+            self.by_type.setdefault(obj_type, []).append(obj)
+
+            if obj_type == "relationship":
+                relationships.append(obj)
+                continue
+
+            external_id = self.get_external_id(obj)
+            if external_id:
+                # Keep the live object when a revoked one still carries the same ID
+                existing = self.by_external_id.get(external_id)
+                if existing is None or existing.get("revoked") or not obj.get("revoked"):
+                    self.by_external_id[external_id] = obj
+
+        # Parent -> sub-technique map from explicit relationships
+        for rel in relationships:
+            rel_type = rel.get("relationship_type", "")
+            if not rel.get("revoked") and not rel.get("x_mitre_deprecated"):
+                self.relations_in.setdefault(rel.get("target_ref"), {}).setdefault(rel_type, []).append(rel)
+                self.relations_out.setdefault(rel.get("source_ref"), {}).setdefault(rel_type, []).append(rel)
+
+            if rel.get("relationship_type") == "revoked-by":
+                self.revoked_by[rel.get("source_ref")] = rel.get("target_ref")
+                continue
+            if rel.get("relationship_type") != "subtechnique-of":
+                continue
+            sub_obj = self.by_stix_id.get(rel.get("source_ref"))
+            parent_obj = self.by_stix_id.get(rel.get("target_ref"))
+            if not sub_obj or not parent_obj:
+                continue
+            sub_id = self.get_external_id(sub_obj)
+            parent_id = self.get_external_id(parent_obj)
+            if sub_id and parent_id:
+                self.subtechniques.setdefault(parent_id, []).append(sub_id)
+
+        # Fall back to the ID scheme for sub-techniques without a relationship
+        for obj in self.by_type.get("attack-pattern", []):
+            external_id = self.get_external_id(obj)
+            if external_id and "." in external_id:
+                parent_id = external_id.split('.')[0]
+                subs = self.subtechniques.setdefault(parent_id, [])
+                if external_id not in subs:
+                    subs.append(external_id)
+
+        for parent_id in self.subtechniques:
+            self.subtechniques[parent_id] = sorted(set(self.subtechniques[parent_id]))
+
+    def get_object(self, stix_id: str) -> Optional[Dict]:
+        """Look up any STIX object by its STIX ID"""
+        return self.by_stix_id.get(stix_id)
+
+    def get_by_external_id(self, external_id: str) -> Optional[Dict]:
+        """Look up any ATT&CK object (technique, mitigation, group...) by ATT&CK ID"""
+        return self.by_external_id.get(external_id)
+
+    def get_technique(self, technique_id: str) -> Optional[Dict]:
+        """Look up an attack-pattern by technique ID"""
+        obj = self.by_external_id.get(technique_id)
+        if obj and obj.get("type") == "attack-pattern":
+            return obj
+        return None
+
+    def get_replacement(self, stix_id: str) -> Optional[str]:
+        """Follow revoked-by relationships to the ATT&CK ID of the live replacement"""
+        seen = set()
+        current = self.revoked_by.get(stix_id)
+        while current and current not in seen:
+            seen.add(current)
+            obj = self.by_stix_id.get(current)
+            if obj is None:
+                return None
+            if not obj.get("revoked") or current not in self.revoked_by:
+                return self.get_external_id(obj)
+            current = self.revoked_by[current]
+        return None
+
+    def get_technique_status(self, technique_id: str) -> Dict:
+        """Validity, deprecation and replacement of a technique from STIX flags"""
+        obj = self.by_external_id.get(technique_id)
+        if obj is None or obj.get("type") != "attack-pattern":
+            return {"valid": False, "deprecated": False, "revoked": False, "replacement": None}
+
+        revoked = bool(obj.get("revoked"))
+        deprecated = bool(obj.get("x_mitre_deprecated"))
+        return {
+            "valid": True,
+            "deprecated": revoked or deprecated,
+            "revoked": revoked,
+            "replacement": self.get_replacement(obj["id"]) if revoked else None,
+        }
+
+    def get_related(self, stix_id: str, relationship_type: str,
+                    object_types: Optional[Tuple[str, ...]] = None,
+                    incoming: bool = True) -> List[Tuple[Dict, Dict]]:
+        """Live objects linked to stix_id by relationship_type, as (object, relationship) pairs
+
+        With incoming=True the object is the relationship source (e.g. the
+        course-of-action that "mitigates" a technique); otherwise the target.
+        """
+        adjacency = self.relations_in if incoming else self.relations_out
+        related = []
+        for rel in adjacency.get(stix_id, {}).get(relationship_type, []):
+            other = self.by_stix_id.get(rel.get("source_ref") if incoming else rel.get("target_ref"))
+            if other is None or other.get("revoked") or other.get("x_mitre_deprecated"):
+                continue
+            if object_types and other.get("type") not in object_types:
+                continue
+            related.append((other, rel))
+        return related
+
+    def get_mitigations(self, technique_id: str) -> List[Tuple[Dict, Dict]]:
+        """Course-of-action objects that mitigate a technique"""
+        technique = self.get_technique(technique_id)
+        if not technique:
+            return []
+        return self.get_related(technique["id"], "mitigates", ("course-of-action",))
+
+    def get_detections(self, technique_id: str) -> List[Tuple[Dict, Dict]]:
+        """Data components that detect a technique"""
+        technique = self.get_technique(technique_id)
+        if not technique:
+            return []
+        return self.get_related(technique["id"], "detects", ("x-mitre-data-component",))
+
+    def get_users(self, technique_id: str,
+                  object_types: Tuple[str, ...] = ("intrusion-set", "malware", "tool")) -> List[Tuple[Dict, Dict]]:
+        """Groups and software that use a technique"""
+        technique = self.get_technique(technique_id)
+        if not technique:
+            return []
+        return self.get_related(technique["id"], "uses", object_types)
+
+    def get_objects_by_type(self, obj_type: str) -> List[Dict]:
+        """All objects of a STIX type"""
+        return self.by_type.get(obj_type, [])
+
+    def get_sub_techniques(self, technique_id: str) -> List[str]:
+        """Sub-technique IDs of a technique (or of its parent, for a sub-technique)"""
+        return list(self.subtechniques.get(technique_id.split('.')[0], []))
+
+# Process-wide stores keyed by bundle path
+_stores: Dict[str, AttackStore] = {}
+_store_mtimes: Dict[str, float] = {}
+_store_lock = threading.Lock()
+
+def get_attack_store(path: str) -> AttackStore:
+    """Return the shared store for a bundle, parsing it only when the file changed
+
+    The compiled on-disk index is preferred; the JSON bundle is parsed (and
+    the index rebuilt) only when the bundle's mtime, size or ETag changed.
+    """
+    mtime = os.path.getmtime(path)
+    with _store_lock:
+        store = _stores.get(path)
+        if store is None or _store_mtimes.get(path) != mtime:
+            store = AttackStore.load_compiled(path)
+            if store is None:
+                print(f"[*] Compiling ATT&CK index for {path}...")
+                store = AttackStore.compile(path)
+            _stores[path] = store
+            _store_mtimes[path] = mtime
+        return store
+
+def clear_attack_stores():
+    """Drop all cached stores (used after a bundle refresh or in tests)"""
+    with _store_lock:
+        _stores.clear()
+        _store_mtimes.clear()
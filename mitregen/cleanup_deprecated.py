@@ -34,12 +34,11 @@ def cleanup_deprecated_techniques():
     invalid_count = 0
     
     print(f"[*] Validating {len(status['techniques'])} techniques...")
+    validations = researcher.validate_techniques([t["id"] for t in status["techniques"]])
     
     for technique in status["techniques"]:
         technique_id = technique["id"]
-        print(f"[*] Checking {technique_id}...")
-        
-        validation = researcher.validate_technique(technique_id)
+        validation = validations[technique_id]
         
         if not validation["valid"]:
             print(f"[!] Invalid technique: {technique_id}")
@@ -66,7 +65,6 @@ def cleanup_deprecated_techniques():
         
         # Technique is valid and current
         updated_techniques.append(technique)
-        print(f"[+] Valid technique: {technique_id}")
     
     # Update status file
     status["techniques"] = updated_techniques
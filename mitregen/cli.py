@@ -13,8 +13,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from .generate import main as generate_main
+    from .llm_cache import LLMCache
 except ImportError:
     from generate import main as generate_main
+    from llm_cache import LLMCache
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -45,11 +47,25 @@ Examples:
                        action="store_true",
                        help="Generate for all platforms")
     
+    parser.add_argument("--no-llm-cache", 
+                       action="store_true",
+                       help="Bypass the LLM response cache")
+    
+    parser.add_argument("--clear-llm-cache", 
+                       action="store_true",
+                       help="Clear the LLM response cache before running")
+    
     return parser.parse_args()
 
 def main():
     args = parse_args()
     
+    if args.clear_llm_cache:
+        removed = LLMCache().clear()
+        print(f"[+] Cleared {removed} LLM cache entries")
+    if args.no_llm_cache:
+        os.environ['LLM_CACHE'] = 'False'
+    
     if args.all_platforms:
         platforms = ["windows", "linux", "macos"]
         for platform in platforms:
@@ -9,7 +9,6 @@ provides examples across multiple languages and platforms.
 
 import os
 import json
-import requests
 import tempfile
 import subprocess
 from pathlib import Path
@@ -23,11 +22,18 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from .agent_debate import AgentDebateSystem, AgentRole
+    from .llm_client import DEFAULT_MODEL, get_client
+    from .llm_dispatcher import get_dispatcher
+    from .llm_telemetry import llm_tags
 except ImportError:
     from agent_debate import AgentDebateSystem, AgentRole
+    from llm_client import DEFAULT_MODEL, get_client
+    from llm_dispatcher import get_dispatcher
+    from llm_telemetry import llm_tags
 
-DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2-uncensored:7b")
-OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434/api/generate")
+# Code-specialised model for code drafts, reviews use the debate system's per-role critic
+# models. Falls back to the main model when not installed; set OLLAMA_CODE_MODEL="" to disable.
+CODE_MODEL = os.getenv("OLLAMA_CODE_MODEL", "qwen2.5-coder:7b")
 
 class CodeLanguage(Enum):
     """Supported programming languages for code examples"""
@@ -82,11 +88,22 @@ class CodeExamplesGenerator:
     Advanced code examples generator with quality validation
     """
     
-    def __init__(self, model: str = DEFAULT_MODEL):
+    def __init__(self, model: str = DEFAULT_MODEL, code_model: Optional[str] = None,
+                 role_models: Optional[Dict[AgentRole, str]] = None):
         self.model = model
-        self.debate_system = AgentDebateSystem(model)
+        self.code_model = code_model or CODE_MODEL or model
+        self.debate_system = AgentDebateSystem(model, role_models)
         self.supported_platforms = ["windows", "linux", "macos", "cross-platform"]
         
+    def _draft_model(self) -> str:
+        """Model for code drafts, the main model if the code model is not installed"""
+        return get_client().resolve_model(self.code_model, fallback=self.model)
+
+    def _draft(self, prompt: str, temperature: float) -> str:
+        """Code draft on the code model"""
+        with llm_tags(stage="draft"):
+            return get_client().generate(prompt, model=self._draft_model(), options={"temperature": temperature})
+
     def generate_comprehensive_examples(self, 
                                       technique_id: str,
                                       technique_name: str,
@@ -103,7 +120,10 @@ class CodeExamplesGenerator:
         if research_context:
             print(f"[*] Using research context: {len(research_context)} chars")
         
-        examples = []
+        # Each (code type, language) pipeline is independent, so they are dispatched
+        # concurrently and collected in submission order
+        dispatcher = get_dispatcher()
+        futures = []
         
         for code_type in code_types:
             print(f"[*] Generating {code_type.value} examples...")
@@ -112,20 +132,22 @@ class CodeExamplesGenerator:
             relevant_languages = self._get_relevant_languages(platform, code_type)
             
             for language in relevant_languages:
-                example = self._generate_single_example(
+                futures.append(dispatcher.submit(
+                    self._generate_and_improve_example,
                     technique_id, technique_name, platform, context,
                     language, code_type, research_context
-                )
-                
-                if example:
-                    # Use agent debate to improve code quality
-                    improved_example = self._improve_example_with_debate(example, context, research_context)
-                    examples.append(improved_example)
+                ))
         
-        # Generate additional specialized examples
+        # Generate additional specialized examples (dispatched internally)
         specialized_examples = self._generate_specialized_examples(
             technique_id, technique_name, platform, context
         )
+        
+        examples = []
+        for future in futures:
+            example = future.result()
+            if example:
+                examples.append(example)
         examples.extend(specialized_examples)
         
         return CodeExampleSet(
@@ -141,6 +163,26 @@ class CodeExamplesGenerator:
             }
         )
     
+    def _generate_and_improve_example(self,
+                                      technique_id: str,
+                                      technique_name: str,
+                                      platform: str,
+                                      context: str,
+                                      language: CodeLanguage,
+                                      code_type: CodeType,
+                                      research_context: str = "") -> Optional[CodeExample]:
+        """Generate a single example and refine it with the agent debate"""
+        
+        example = self._generate_single_example(
+            technique_id, technique_name, platform, context,
+            language, code_type, research_context
+        )
+        
+        if example:
+            # Use agent debate to improve code quality
+            return self._improve_example_with_debate(example, context, research_context)
+        return None
+    
     def _get_relevant_languages(self, platform: str, code_type: CodeType) -> List[CodeLanguage]:
         """Get relevant programming languages for platform and code type"""
         
@@ -196,17 +238,8 @@ class CodeExamplesGenerator:
         )
         
         try:
-            data = {
-                "model": self.model,
-                "prompt": code_prompt,
-                "stream": False,
-                "options": {"temperature": 0.5}  # Lower temperature for code consistency
-            }
-            
-            response = requests.post(OLLAMA_URL, json=data, timeout=120)
-            response.raise_for_status()
-            
-            raw_response = response.json().get("response", "")
+            # Lower temperature for code consistency
+            raw_response = self._draft(code_prompt, temperature=0.5)
             
             # Parse the structured response
             parsed_example = self._parse_code_response(raw_response, language, code_type)
@@ -528,14 +561,16 @@ Simulation code should:
         """Generate specialized examples (configurations, queries, etc.)"""
         
         specialized_examples = []
+        dispatcher = get_dispatcher()
         
         # Generate detection queries (Sigma, KQL, Splunk)
-        query_examples = self._generate_detection_queries(technique_id, technique_name, platform, context)
-        specialized_examples.extend(query_examples)
+        query_future = dispatcher.submit(self._generate_detection_queries, technique_id, technique_name, platform, context)
         
         # Generate configuration examples
-        config_examples = self._generate_configuration_examples(technique_id, technique_name, platform, context)
-        specialized_examples.extend(config_examples)
+        config_future = dispatcher.submit(self._generate_configuration_examples, technique_id, technique_name, platform, context)
+        
+        specialized_examples.extend(query_future.result())
+        specialized_examples.extend(config_future.result())
         
         return specialized_examples
     
@@ -562,17 +597,7 @@ Format as valid YAML Sigma rule.
 """
         
         try:
-            data = {
-                "model": self.model,
-                "prompt": sigma_prompt,
-                "stream": False,
-                "options": {"temperature": 0.3}
-            }
-            
-            response = requests.post(OLLAMA_URL, json=data, timeout=120)
-            response.raise_for_status()
-            
-            sigma_code = response.json().get("response", "")
+            sigma_code = self._draft(sigma_prompt, temperature=0.3)
             
             examples.append(CodeExample(
                 title=f"Sigma Detection Rule - {technique_id}",
@@ -615,17 +640,7 @@ Format as PowerShell commands or .reg file content.
 """
             
             try:
-                data = {
-                    "model": self.model,
-                    "prompt": gpo_prompt,
-                    "stream": False,
-                    "options": {"temperature": 0.3}
-                }
-                
-                response = requests.post(OLLAMA_URL, json=data, timeout=120)
-                response.raise_for_status()
-                
-                gpo_config = response.json().get("response", "")
+                gpo_config = self._draft(gpo_prompt, temperature=0.3)
                 
                 examples.append(CodeExample(
                     title=f"Windows GPO Configuration - {technique_id}",
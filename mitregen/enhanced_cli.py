@@ -18,11 +18,13 @@ try:
     from .agent_debate import AgentDebateSystem, enhanced_generation_with_debate
     from .code_examples import CodeExamplesGenerator, CodeType
     from .universal_project_manager import UniversalProjectManager
+    from .llm_cache import LLMCache
 except ImportError:
     from generate import main as generate_main
     from agent_debate import AgentDebateSystem, enhanced_generation_with_debate
     from code_examples import CodeExamplesGenerator, CodeType
     from universal_project_manager import UniversalProjectManager
+    from llm_cache import LLMCache
 
 def test_agent_debate(technique_id="T1059.001", platform="windows"):
     """Test the agent debate system with a sample technique"""
@@ -268,6 +270,10 @@ Examples:
                       help='Generate comprehensive code examples')
     parser.add_argument('--no-code', action='store_true',
                       help='Skip code examples generation')
+    parser.add_argument('--no-llm-cache', action='store_true',
+                      help='Bypass the LLM response cache')
+    parser.add_argument('--clear-llm-cache', action='store_true',
+                      help='Clear the LLM response cache before running')
     
     # Output options
     parser.add_argument('--verbose', action='store_true', default=True,
@@ -285,6 +291,13 @@ Examples:
     if args.quiet:
         args.verbose = False
     
+    if args.clear_llm_cache:
+        removed = LLMCache().clear()
+        print(f"[+] Cleared {removed} LLM cache entries")
+    # Set in the environment so method_cli subprocesses inherit it
+    if args.no_llm_cache:
+        os.environ['LLM_CACHE'] = 'False'
+    
     # Execute requested action
     if args.test_debate:
         test_agent_debate(args.technique, args.platform)
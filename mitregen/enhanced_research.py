@@ -6,7 +6,10 @@ This module provides comprehensive research context using multiple sources and v
 import os
 import json
 import requests
+import re
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 import time
@@ -14,6 +17,13 @@ import time
 # Add current directory to path for relative imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+try:
+    from .attack_store import (AttackStore, get_attack_store, read_meta, write_meta, snapshot_previous,
+                               ATTACK_DOMAINS, DEFAULT_DOMAIN, domains_for_id)
+except ImportError:
+    from attack_store import (AttackStore, get_attack_store, read_meta, write_meta, snapshot_previous,
+                              ATTACK_DOMAINS, DEFAULT_DOMAIN, domains_for_id)
+
 # Import external research capability
 try:
     from .external_research import get_enhanced_external_context
@@ -35,113 +45,176 @@ class MITREResearcher:
         os.makedirs(self.cache_dir, exist_ok=True)
         
     def validate_technique(self, technique_id: str) -> Dict:
-        """Validate if technique exists and get current status"""
-        try:
-            # Check MITRE ATT&CK page directly
-            url = f"{self.base_url}/techniques/{technique_id}/"
-            response = requests.get(url, timeout=10)
+        """Validate if technique exists and get current status from the cached bundle"""
+        return self.validate_techniques([technique_id])[technique_id]
+    
+    def validate_techniques(self, technique_ids: List[str], online_fallback: bool = False,
+                            max_workers: int = 8) -> Dict[str, Dict]:
+        """Validate many techniques in one pass over the indexed bundles
+        
+        IDs are grouped by domain so each bundle is loaded at most once. IDs not
+        found in any bundle are invalid, or with online_fallback are checked
+        against attack.mitre.org through a pool of max_workers threads.
+        """
+        results = {}
+        pending = list(dict.fromkeys(technique_ids))
+        stores = {}
+        
+        for attempt in range(len(ATTACK_DOMAINS)):
+            by_domain = {}
+            for technique_id in pending:
+                by_domain.setdefault(domains_for_id(technique_id)[attempt], []).append(technique_id)
             
-            if response.status_code == 200:
-                content = response.text.lower()
-                
-                # Check for deprecation
-                is_deprecated = "deprecation warning" in content or "deprecated" in content
-                
-                # Try to extract replacement technique
-                replacement = None
-                if is_deprecated and "please use" in content:
-                    # Extract technique ID from replacement text
-                    import re
-                    match = re.search(r'techniques/(T\d+(?:\.\d+)?)', content)
-                    if match:
-                        replacement = match.group(1)
-                
-                return {
-                    "valid": True,
-                    "deprecated": is_deprecated,
-                    "replacement": replacement,
-                    "url": url
-                }
-            else:
-                return {"valid": False, "deprecated": False, "replacement": None, "url": url}
-                
+            unresolved = []
+            for domain, ids in by_domain.items():
+                if domain not in stores:
+                    try:
+                        stores[domain] = self.get_store(domain)
+                    except Exception as e:
+                        print(f"[-] ATT&CK domain {domain} unavailable: {e}")
+                        stores[domain] = None
+                store = stores[domain]
+                for technique_id in ids:
+                    if store is not None and store.get_technique(technique_id):
+                        status = store.get_technique_status(technique_id)
+                        status["url"] = f"{self.base_url}/techniques/{technique_id}/"
+                        results[technique_id] = status
+                    else:
+                        unresolved.append(technique_id)
+            pending = unresolved
+            if not pending:
+                break
+        
+        if pending and online_fallback:
+            print(f"[*] Checking {len(pending)} unresolved techniques online...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for technique_id, status in zip(pending, executor.map(self._check_online, pending)):
+                    results[technique_id] = status
+        else:
+            for technique_id in pending:
+                results[technique_id] = {"valid": False, "deprecated": False, "revoked": False,
+                                         "replacement": None, "url": f"{self.base_url}/techniques/{technique_id}/"}
+        
+        return results
+    
+    def _check_online(self, technique_id: str) -> Dict:
+        """Existence check against attack.mitre.org for IDs missing from the cached bundles"""
+        url = f"{self.base_url}/techniques/{technique_id.replace('.', '/')}/"
+        try:
+            response = requests.head(url, timeout=10, allow_redirects=True)
+            valid = response.status_code == 200
         except Exception as e:
             print(f"[-] Error validating technique {technique_id}: {e}")
-            return {"valid": False, "deprecated": False, "replacement": None, "url": None}
+            valid = False
+        return {"valid": valid, "deprecated": False, "revoked": False, "replacement": None, "url": url}
+    
+    def get_cache_file(self, domain: str = DEFAULT_DOMAIN) -> str:
+        """Path of the cached bundle for an ATT&CK domain"""
+        return os.path.join(self.cache_dir, f"{domain}.json")
+    
+    def get_store(self, domain: str = DEFAULT_DOMAIN) -> AttackStore:
+        """Return the indexed bundle of an ATT&CK domain, refreshing the cache when stale"""
+        if domain not in ATTACK_DOMAINS:
+            raise ValueError(f"Unknown ATT&CK domain: {domain}")
+        url = f"{self.api_base}/{domain}/{domain}.json"
+        cache_file = self.get_cache_file(domain)
+        
+        # Revalidate with upstream if not checked recently (< 24 hours)
+        if not os.path.exists(cache_file):
+            self._fetch_and_cache(url, cache_file)
+        else:
+            checked_at = read_meta(cache_file).get("checked_at", os.stat(cache_file).st_mtime)
+            if time.time() - checked_at >= 86400:
+                try:
+                    self._fetch_and_cache(url, cache_file)
+                except Exception as e:
+                    print(f"[-] Could not refresh ATT&CK bundle, using cached copy: {e}")
+        
+        return get_attack_store(cache_file)
+    
+    def resolve_technique(self, technique_id: str) -> Tuple[Optional[AttackStore], Optional[Dict]]:
+        """Find a technique across ATT&CK domains, loading each domain only when needed"""
+        for domain in domains_for_id(technique_id):
+            try:
+                store = self.get_store(domain)
+            except Exception as e:
+                print(f"[-] ATT&CK domain {domain} unavailable: {e}")
+                continue
+            technique = store.get_technique(technique_id)
+            if technique:
+                return store, technique
+        return None, None
+    
+    def _store_for(self, obj: Dict) -> AttackStore:
+        """Store of the domain a STIX object belongs to"""
+        domains = obj.get("x_mitre_domains") or [DEFAULT_DOMAIN]
+        return self.get_store(domains[0] if domains[0] in ATTACK_DOMAINS else DEFAULT_DOMAIN)
     
     def get_technique_data(self, technique_id: str) -> Optional[Dict]:
         """Fetch comprehensive technique data from MITRE"""
         try:
-            # Fetch from MITRE CTI repository
-            url = f"{self.api_base}/enterprise-attack/enterprise-attack.json"
-            cache_file = os.path.join(self.cache_dir, "enterprise-attack.json")
-            
-            # Use cache if recent (< 24 hours)
-            if os.path.exists(cache_file):
-                stat = os.stat(cache_file)
-                if time.time() - stat.st_mtime < 86400:  # 24 hours
-                    with open(cache_file, 'r') as f:
-                        data = json.load(f)
-                else:
-                    data = self._fetch_and_cache(url, cache_file)
-            else:
-                data = self._fetch_and_cache(url, cache_file)
-            
-            # Find the technique
-            for obj in data.get("objects", []):
-                if obj.get("type") == "attack-pattern":
-                    external_refs = obj.get("external_references", [])
-                    for ref in external_refs:
-                        if ref.get("external_id") == technique_id:
-                            return obj
-            
-            return None
+            return self.resolve_technique(technique_id)[1]
             
         except Exception as e:
             print(f"[-] Error fetching technique data for {technique_id}: {e}")
             return None
     
-    def _fetch_and_cache(self, url: str, cache_file: str) -> Dict:
-        """Fetch data and cache it"""
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+    def _fetch_and_cache(self, url: str, cache_file: str) -> str:
+        """Conditionally fetch the bundle and stream it into the cache file
         
-        with open(cache_file, 'w') as f:
-            json.dump(data, f)
+        Sends If-None-Match/If-Modified-Since from the stored metadata so an
+        unchanged upstream costs a 304. New content is streamed to a temp file
+        and renamed into place, so readers never see a partial bundle.
+        """
+        meta = read_meta(cache_file) if os.path.exists(cache_file) else {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
         
-        return data
+        with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                print(f"[+] ATT&CK bundle unchanged upstream: {cache_file}")
+                meta["checked_at"] = time.time()
+                write_meta(cache_file, meta)
+                return cache_file
+            
+            response.raise_for_status()
+            print(f"[*] Downloading ATT&CK bundle to {cache_file}...")
+            
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+                # Keep the outgoing version so releases can be diffed (attack_diff.py)
+                if os.path.exists(cache_file):
+                    snapshot_previous(cache_file)
+                os.replace(tmp_path, cache_file)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            
+            # Record upstream version so later refreshes can be conditional
+            write_meta(cache_file, {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "checked_at": time.time()
+            })
+        
+        return cache_file
     
     def get_sub_techniques(self, technique_id: str) -> List[str]:
         """Get all sub-techniques for a main technique"""
         try:
-            data = self.get_technique_data(technique_id)
-            if not data:
+            store, technique = self.resolve_technique(technique_id)
+            if not technique:
                 return []
             
             # Sub-techniques have IDs like T1059.001, T1059.002, etc.
-            sub_techniques = []
-            base_id = technique_id.split('.')[0]  # Get T1059 from T1059.001
-            
-            # Fetch all techniques and find sub-techniques
-            url = f"{self.api_base}/enterprise-attack/enterprise-attack.json"
-            cache_file = os.path.join(self.cache_dir, "enterprise-attack.json")
-            
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r') as f:
-                    full_data = json.load(f)
-            else:
-                full_data = self._fetch_and_cache(url, cache_file)
-            
-            for obj in full_data.get("objects", []):
-                if obj.get("type") == "attack-pattern":
-                    external_refs = obj.get("external_references", [])
-                    for ref in external_refs:
-                        ext_id = ref.get("external_id", "")
-                        if ext_id.startswith(base_id + "."):
-                            sub_techniques.append(ext_id)
-            
-            return sorted(sub_techniques)
+            return store.get_sub_techniques(technique_id)
             
         except Exception as e:
             print(f"[-] Error getting sub-techniques for {technique_id}: {e}")
@@ -180,15 +253,18 @@ class MITREResearcher:
         
         # Build context based on file type
         contexts = {
-            "description.md": self._build_description_context(technique_data, platform, sub_techniques),
-            "detection.md": self._build_detection_context(technique_data, platform),
-            "mitigation.md": self._build_mitigation_context(technique_data, platform),
-            "purple_playbook.md": self._build_purple_context(technique_data, platform),
-            "references.md": self._build_references_context(technique_data),
-            "agent_notes.md": self._build_agent_context(technique_data, platform)
+            "description.md": lambda: self._build_description_context(technique_data, platform, sub_techniques),
+            "detection.md": lambda: self._build_detection_context(technique_data, platform),
+            "mitigation.md": lambda: self._build_mitigation_context(technique_data, platform),
+            "purple_playbook.md": lambda: self._build_purple_context(technique_data, platform),
+            "references.md": lambda: self._build_references_context(technique_data),
+            "agent_notes.md": lambda: self._build_agent_context(technique_data, platform)
         }
         
-        context = contexts.get(file_type, f"Provide comprehensive information about {name} ({technique_id}) on {platform}.")
+        if file_type in contexts:
+            context = contexts[file_type]()
+        else:
+            context = f"Provide comprehensive information about {name} ({technique_id}) on {platform}."
         
         # Enhance with external research if available
         external_context = ""
@@ -252,8 +328,49 @@ Technical focus areas:
         
         return context
     
+    def _format_related(self, related: List[Tuple[Dict, Dict]], label, limit: int = 10) -> str:
+        """Render related STIX objects as prompt lines, one per object"""
+        lines = []
+        for obj, rel in related[:limit]:
+            external_id = AttackStore.get_external_id(obj)
+            title = f"{label(obj)} ({external_id})" if external_id else label(obj)
+            detail = rel.get("description") or obj.get("description") or ""
+            detail = " ".join(re.sub(r"\(Citation:[^)]*\)", "", detail).split())
+            lines.append(f"- {title}: {detail[:200]}" if detail else f"- {title}")
+        if len(related) > limit:
+            lines.append(f"- ...and {len(related) - limit} more")
+        return "\n".join(lines)
+    
+    def _get_related_context(self, technique_data: Dict, relationship_type: str,
+                             object_types: Tuple[str, ...], heading: str, label=None) -> str:
+        """Section of ATT&CK objects linked to the technique, empty if none"""
+        try:
+            store = self._store_for(technique_data)
+            related = store.get_related(technique_data.get("id", ""), relationship_type, object_types)
+        except Exception as e:
+            print(f"[-] Error reading ATT&CK relationships: {e}")
+            return ""
+        
+        if not related:
+            return ""
+        
+        label = label or (lambda obj: obj.get("name", "Unknown"))
+        return f"\n\n{heading}:\n{self._format_related(related, label)}"
+    
+    def _data_component_label(self, component: Dict) -> str:
+        """'Data Source: Data Component' label for a data component"""
+        data_source = self._store_for(component).get_object(component.get("x_mitre_data_source_ref", ""))
+        if data_source:
+            return f"{data_source.get('name', 'Unknown')}: {component.get('name', 'Unknown')}"
+        return component.get("name", "Unknown")
+    
     def _build_detection_context(self, technique_data: Dict, platform: str) -> str:
         name = technique_data.get("name", "Unknown")
+        detections = self._get_related_context(
+            technique_data, "detects", ("x-mitre-data-component",),
+            "ATT&CK DATA COMPONENTS THAT DETECT THIS TECHNIQUE (base rules on these)",
+            self._data_component_label
+        )
         
         return f"""Create comprehensive detection rules for {name} on {platform}.
 
@@ -269,10 +386,14 @@ Focus on:
 - High-fidelity detection with low false positives  
 - Platform-specific artifacts and behaviors
 - Multi-stage detection coverage
-- Tuning recommendations for enterprise environments"""
+- Tuning recommendations for enterprise environments{detections}"""
     
     def _build_mitigation_context(self, technique_data: Dict, platform: str) -> str:
         name = technique_data.get("name", "Unknown")
+        mitigations = self._get_related_context(
+            technique_data, "mitigates", ("course-of-action",),
+            "ATT&CK MITIGATIONS FOR THIS TECHNIQUE (expand each into concrete steps)"
+        )
         
         return f"""Create specific, actionable mitigations for {name} on {platform}.
 
@@ -288,10 +409,19 @@ Avoid generic advice. Focus on:
 - Registry modifications, Group Policy settings
 - Application controls and allowlisting
 - Network segmentation and access controls
-- Monitoring and logging enhancements"""
+- Monitoring and logging enhancements{mitigations}"""
     
     def _build_purple_context(self, technique_data: Dict, platform: str) -> str:
         name = technique_data.get("name", "Unknown")
+        procedures = self._get_related_context(
+            technique_data, "uses", ("intrusion-set", "malware", "tool"),
+            "KNOWN PROCEDURE EXAMPLES (groups and software observed using this technique)"
+        )
+        detections = self._get_related_context(
+            technique_data, "detects", ("x-mitre-data-component",),
+            "ATT&CK DATA COMPONENTS FOR BLUE TEAM VALIDATION",
+            self._data_component_label
+        )
         
         return f"""Create a realistic purple team exercise for {name} on {platform}.
 
@@ -307,7 +437,7 @@ Exercise components:
 - Step-by-step red team execution with expected outputs
 - Real-time blue team monitoring and response procedures
 - Post-exercise analysis and improvement recommendations
-- Metrics for measuring detection and response effectiveness"""
+- Metrics for measuring detection and response effectiveness{procedures}{detections}"""
     
     def _build_references_context(self, technique_data: Dict) -> str:
         return """Compile authoritative references and sources.
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Local stand-in Ollama server for deterministic benchmarks.
+Implements /api/generate, /api/chat (streaming and not), /api/tags and
+/api/version with configurable load time, prompt-eval rate, tokens/sec and
+parallel slots. Replies are templated: valid agent JSON when a format is
+requested, technique-specific markdown otherwise.
+
+Serve it and point the pipeline at it:
+    python fake_ollama.py --port 11435
+    OLLAMA_HOST=http://127.0.0.1:11435 python cli.py --platform windows
+
+Or run the built-in benchmark against an in-process server:
+    python fake_ollama.py --benchmark debate --tokens-per-sec 200
+
+The generation benchmark times a single ollama_generate call (draft,
+pre-gate, debate); it does not run generate.main, so research, file writes
+and code examples are not measured.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+
+TECHNIQUE_PATTERN = re.compile(r"\b(T\d{4}(?:\.\d{3})?|(?:CD|CO|ET|INF|BTM|IR|TI)-\d+)\b")
+
+@dataclass
+class FakeServerConfig:
+    """Simulated inference characteristics"""
+    tokens_per_sec: float = 50.0
+    prompt_eval_rate: float = 2000.0  # prompt tokens/sec for uncached prefixes
+    latency: float = 0.05  # per-request overhead before the first token
+    load_time: float = 0.5  # first use of a model that is not loaded
+    response_tokens: int = 300
+    parallel: int = 4  # like OLLAMA_NUM_PARALLEL, extra requests queue
+    models: List[str] = field(default_factory=lambda: ["llama2-uncensored:7b"])
+
+@dataclass
+class FakeServerStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    eval_tokens: int = 0
+    loads: int = 0
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+def markdown_reply(prompt: str, tokens: int) -> str:
+    """Technique-specific markdown of roughly the requested token count"""
+    match = TECHNIQUE_PATTERN.search(prompt)
+    technique = match.group(1) if match else "T1059"
+    sections = [
+        f"# {technique} Analysis\n\n## Overview\n{technique} is examined here with concrete detection and "
+        f"mitigation guidance for defenders.\n",
+        f"## Detection\nMonitor process creation events (Event ID 4688, Sysmon Event ID 1) for {technique} "
+        f"activity and correlate parent/child relationships.\n\n```powershell\n"
+        f"Get-WinEvent -FilterHashtable @{{LogName='Security'; Id=4688}} |\n"
+        f"    Where-Object {{ $_.Message -match 'powershell' }}\n```\n",
+        f"## Mitigation\nApply application control and constrained language mode; restrict script "
+        f"execution to signed code for {technique}.\n\n```yaml\ndetection:\n  selection:\n"
+        f"    Image|endswith: '\\\\powershell.exe'\n  condition: selection\n```\n",
+        f"## Implementation\n1. Enable command line auditing\n2. Forward logs to the SIEM\n"
+        f"3. Tune the rules for {technique} against a baseline of legitimate administration\n",
+    ]
+    text = "\n".join(sections)
+    while count_tokens(text) < tokens:
+        text += f"\n### Additional Notes\nValidate coverage for {technique} with atomic tests and review "
+        text += "false positives from management tooling before enforcing blocking controls.\n"
+    return text
+
+def agent_reply(prompt: str, tokens: int) -> str:
+    """Valid debate agent JSON, deterministic per prompt"""
+    seed = _seed(prompt)
+    return json.dumps({
+        "agent_role": "reviewer",
+        "confidence": round(7.0 + (seed % 21) / 10, 1),
+        "strengths": ["Concrete detection logic with event IDs"],
+        "weaknesses": ["Limited coverage of evasion variants"],
+        "suggestions": ["Add parent process correlation", "Include Sysmon configuration snippet"],
+        "criticisms": [] if seed % 3 else ["Mitigation section lacks rollout guidance"],
+        "improvements": ["Add a tested Sigma rule with false positive notes"],
+        "enhanced_content": markdown_reply(prompt, max(tokens - 80, 50)),
+        "code_examples": [],
+        "technical_details": [],
+        "security_considerations": [],
+        "rationale": "Templated response from the stand-in server"
+    })
+
+class FakeOllama:
+    """Server state: loaded models, prefix cache, slots and stats"""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.stats = FakeServerStats()
+        self.loaded: Set[str] = set()
+        self.last_prompt: Dict[str, str] = {}
+        self.slots = threading.BoundedSemaphore(config.parallel)
+        self.lock = threading.Lock()
+
+    def _prefix_cached(self, model: str, prompt: str) -> int:
+        """Chars of the prompt shared with the model's previous prompt (KV cache reuse)"""
+        with self.lock:
+            previous = self.last_prompt.get(model, "")
+            self.last_prompt[model] = prompt
+        shared = 0
+        for a, b in zip(previous, prompt):
+            if a != b:
+                break
+            shared += 1
+        return shared
+
+    def _load(self, model: str, keep_alive) -> float:
+        with self.lock:
+            if keep_alive == 0 or keep_alive == "0":
+                self.loaded.discard(model)
+                return 0.0
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+            self.stats.loads += 1
+        time.sleep(self.config.load_time)
+        return self.config.load_time
+
+    def complete(self, body: Dict, chat: bool):
+        """Yield response chunks for a generate/chat request"""
+        model = body.get("model", self.config.models[0])
+        if chat:
+            prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        else:
+            prompt = body.get("prompt", "")
+
+        with self.slots:
+            start = time.time()
+            load_duration = self._load(model, body.get("keep_alive"))
+
+            # Load/unload-only request
+            if not prompt:
+                reason = "unload" if body.get("keep_alive") in (0, "0") else "load"
+                yield {"model": model, "done": True, "done_reason": reason,
+                       "load_duration": int(load_duration * 1e9)}
+                return
+
+            cached = count_tokens(prompt[:self._prefix_cached(model, prompt)])
+            prompt_tokens = count_tokens(prompt)
+            prompt_eval = max(prompt_tokens - cached, 1) / self.config.prompt_eval_rate
+            time.sleep(self.config.latency + prompt_eval)
+
+            tokens = self.config.response_tokens
+            text = agent_reply(prompt, tokens) if body.get("format") else markdown_reply(prompt, tokens)
+            pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+            delay = 1.0 / self.config.tokens_per_sec
+            eval_start = time.time()
+
+            for i, piece in enumerate(pieces, 1):
+                # Sleep against a schedule so high rates aren't capped by sleep granularity
+                wait = eval_start + i * delay - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                yield {"model": model, "done": False, **self._text(piece, chat)}
+
+            eval_duration = time.time() - eval_start
+            with self.lock:
+                self.stats.requests += 1
+                self.stats.prompt_tokens += prompt_tokens
+                self.stats.cached_prompt_tokens += cached
+                self.stats.eval_tokens += len(pieces)
+
+            yield {
+                "model": model, "done": True, "done_reason": "stop", **self._text("", chat),
+                "total_duration": int((time.time() - start) * 1e9),
+                "load_duration": int(load_duration * 1e9),
+                "prompt_eval_count": max(prompt_tokens - cached, 1),
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int(eval_duration * 1e9),
+            }
+
+    def _text(self, text: str, chat: bool) -> Dict:
+        return {"message": {"role": "assistant", "content": text}} if chat else {"response": text}
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (stop conditions) reset the connection
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+def make_handler(server_state: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, obj: Dict, status: int = 200):
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                self._send_json({"version": "0.0.0-fake"})
+            elif self.path == "/api/tags":
+                self._send_json({"models": [{"name": m} for m in server_state.config.models]})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path not in ("/api/generate", "/api/chat"):
+                self._send_json({"error": "not found"}, 404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._send_json({"error": "invalid JSON body"}, 400)
+                return
+
+            model = body.get("model", "")
+            if model not in server_state.config.models and f"{model}:latest" not in server_state.config.models:
+                self._send_json({"error": f"model '{model}' not found"}, 404)
+                return
+
+            chunks = server_state.complete(body, chat=self.path == "/api/chat")
+            try:
+                if body.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in chunks:
+                        line = (json.dumps(chunk) + "\n").encode("utf-8")
+                        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    text = []
+                    final = {}
+                    for chunk in chunks:
+                        text.append(chunk.get("response") or chunk.get("message", {}).get("content", ""))
+                        final = chunk
+                    key = "message" if self.path == "/api/chat" else "response"
+                    final[key] = {"role": "assistant", "content": "".join(text)} if key == "message" else "".join(text)
+                    self._send_json(final)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client stopped reading early (stop condition), like Ollama we just abort
+                chunks.close()
+
+    return Handler
+
+def start_server(config: FakeServerConfig, port: int = 0, host: str = "127.0.0.1"):
+    """Start the stand-in server in a background thread, returns (server, state, base_url)"""
+    state = FakeOllama(config)
+    server = FakeHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://{host}:{server.server_address[1]}"
+
+SAMPLE_CONTENT = """# T1059.001 PowerShell
+
+PowerShell is a powerful command-line shell and scripting language.
+Attackers often use PowerShell to execute malicious commands.
+
+## Detection
+Monitor for powershell.exe execution.
+"""
+
+def run_benchmark(kind: str, config: FakeServerConfig, rounds: int = 2, pre_gate: bool = False) -> Dict:
+    """Run a pipeline stage against an in-process stand-in server and time it"""
+    server, state, base_url = start_server(config)
+
+    # The LLM layer reads its configuration at import time, so set it up first
+    os.environ["OLLAMA_HOST"] = base_url
+    os.environ.pop("OLLAMA_HOSTS", None)
+    os.environ["OLLAMA_MODEL"] = config.models[0]
+    os.environ.setdefault("LLM_CACHE", "False")
+    # The templated drafts clear the debate pre-gate, which would leave nothing to measure
+    os.environ["DEBATE_PRE_GATE"] = str(pre_gate)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        from .agent_debate import AgentDebateSystem
+        from .generate import ollama_generate
+    except ImportError:
+        from agent_debate import AgentDebateSystem
+        from generate import ollama_generate
+
+    start = time.time()
+    if kind == "debate":
+        AgentDebateSystem(config.models[0]).multi_round_debate(
+            SAMPLE_CONTENT, "MITRE ATT&CK Technique T1059.001 - PowerShell on windows",
+            max_rounds=rounds, consensus_threshold=9.5, research_context=SAMPLE_CONTENT
+        )
+    elif kind == "generation":
+        ollama_generate(f"Write detection guidance for T1059.001.\n\n{SAMPLE_CONTENT}", config.models[0],
+                        "T1059.001", use_debate=True, research_context=SAMPLE_CONTENT)
+    else:
+        raise ValueError(f"Unknown benchmark: {kind}")
+    elapsed = time.time() - start
+    server.shutdown()
+
+    try:
+        from .llm_telemetry import get_telemetry
+    except ImportError:
+        from llm_telemetry import get_telemetry
+    get_telemetry().print_summary("stage")
+
+    stats = state.stats
+    return {
+        "benchmark": kind,
+        "wall_seconds": round(elapsed, 2),
+        "requests": stats.requests,
+        "prompt_tokens": stats.prompt_tokens,
+        "cached_prompt_tokens": stats.cached_prompt_tokens,
+        "eval_tokens": stats.eval_tokens,
+        "model_loads": stats.loads,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--prompt-eval-rate", type=float, default=2000.0,
+                        help="Prompt tokens/sec for prefixes not in the simulated KV cache")
+    parser.add_argument("--latency", type=float, default=0.05, help="Per-request overhead in seconds")
+    parser.add_argument("--load-time", type=float, default=0.5, help="Model load time in seconds")
+    parser.add_argument("--response-tokens", type=int, default=300)
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent requests served")
+    parser.add_argument("--models", default=os.getenv("OLLAMA_MODEL", "llama2-uncensored:7b"),
+                        help="Comma-separated model names to serve")
+    parser.add_argument("--benchmark", choices=["debate", "generation"],
+                        help="Run a pipeline stage against an in-process server and report timings "
+                             "(generation = one ollama_generate call, not generate.main)")
+    parser.add_argument("--rounds", type=int, default=2, help="Debate rounds for the debate benchmark")
+    parser.add_argument("--pre-gate", action="store_true",
+                        help="Keep the debate pre-gate in the generation benchmark (templated drafts skip the debate)")
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        tokens_per_sec=args.tokens_per_sec,
+        prompt_eval_rate=args.prompt_eval_rate,
+        latency=args.latency,
+        load_time=args.load_time,
+        response_tokens=args.response_tokens,
+        parallel=args.parallel,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+    )
+
+    if args.benchmark:
+        result = run_benchmark(args.benchmark, config, args.rounds, args.pre_gate)
+        print(json.dumps(result, indent=2))
+        return
+
+    server = FakeHTTPServer((args.host, args.port), make_handler(FakeOllama(config)))
+    print(f"[*] Fake Ollama serving {', '.join(config.models)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[*] Stopped")
+
+if __name__ == "__main__":
+    main()
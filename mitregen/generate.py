@@ -1,6 +1,5 @@
 import os
 import json
-import requests
 from pathlib import Path
 from datetime import datetime
 import sys
@@ -9,21 +8,41 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from .prompts import get_prompt
+    from .prompts import get_prompt, required_headings
     from .universal_research import get_universal_deep_context
     from .research_summary import ResearchSummaryManager
-    from .agent_debate import enhanced_generation_with_debate, AgentDebateSystem
-    from .code_examples import CodeExamplesGenerator, CodeType
+    from .agent_debate import enhanced_generation_with_debate, AgentDebateSystem, default_role_models
+    from .code_examples import CodeExamplesGenerator, CodeType, CODE_MODEL
+    from .attack_diff import STALE_STATUS, clear_stale
+    from .llm_client import DEFAULT_MODEL, get_client
+    from .prompt_budget import PromptSection, fit_sections, prompt_budget
+    from .llm_telemetry import get_telemetry, llm_tags
+    from .llm_dispatcher import get_dispatcher
 except ImportError:
-    from prompts import get_prompt
+    from prompts import get_prompt, required_headings
     from universal_research import get_universal_deep_context
     from research_summary import ResearchSummaryManager
-    from agent_debate import enhanced_generation_with_debate, AgentDebateSystem
-    from code_examples import CodeExamplesGenerator, CodeType
+    from agent_debate import enhanced_generation_with_debate, AgentDebateSystem, default_role_models
+    from code_examples import CodeExamplesGenerator, CodeType, CODE_MODEL
+    from attack_diff import STALE_STATUS, clear_stale
+    from llm_client import DEFAULT_MODEL, get_client
+    from prompt_budget import PromptSection, fit_sections, prompt_budget
+    from llm_telemetry import get_telemetry, llm_tags
+    from llm_dispatcher import get_dispatcher
 
-DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2-uncensored:7b")
-OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434/api/generate")
 PROJECT_STATUS = "project_status.json"
+# Tokens kept free for the 500-char previous-attempt excerpt in iterative generation
+PREVIOUS_ATTEMPT_TOKENS = 200
+
+# Local pre-gate on the initial draft: drafts scoring at least PRE_GATE_SKIP_SCORE with
+# every required ## section present and at least PRE_GATE_MIN_SECTION_CHARS long skip the
+# debate, those scoring PRE_GATE_ABBREVIATED_SCORE with most sections get a single round,
+# everything else the full debate
+DEBATE_PRE_GATE = os.getenv("DEBATE_PRE_GATE", "True").lower() not in ("false", "0", "no", "off")
+PRE_GATE_SKIP_SCORE = float(os.getenv("PRE_GATE_SKIP_SCORE", "9.0"))
+PRE_GATE_ABBREVIATED_SCORE = float(os.getenv("PRE_GATE_ABBREVIATED_SCORE", "7.5"))
+PRE_GATE_ABBREVIATED_COVERAGE = 0.75
+PRE_GATE_MIN_SECTION_CHARS = int(os.getenv("PRE_GATE_MIN_SECTION_CHARS", "300"))
 TEMPLATE_FILES = [
     "description.md",
     "code_samples/",
@@ -74,6 +93,68 @@ def load_status():
 def is_placeholder(content):
     return any(pat in content for pat in PLACEHOLDER_PATTERNS)
 
+def markdown_sections(content):
+    """## sections of a markdown document as lowercased title -> body, fenced code blocks are not parsed"""
+    sections = {}
+    current = None
+    in_code = False
+    for line in content.splitlines():
+        if line.lstrip().startswith(("```", "~~~")):
+            in_code = not in_code
+        elif not in_code and line.startswith("## "):
+            current = line[3:].strip().lower()
+            sections[current] = []
+            continue
+        if current is not None:
+            sections[current].append(line)
+    return {title: "\n".join(body).strip() for title, body in sections.items()}
+
+def required_sections(content, file_type):
+    """Bodies of the file template's required sections found in the content, None without a template"""
+    required = required_headings(file_type) if file_type else []
+    if not required:
+        return None
+    sections = markdown_sections(content)
+    found = {}
+    for title in required:
+        for heading, body in sections.items():
+            if title.lower() in heading:
+                found[title] = body
+                break
+    return found, len(required)
+
+def pre_gate_decision(content, technique_id=None, file_type=None, existing_content=""):
+    """Decide how much debate a draft needs, returns "skip", "abbreviated" or "full"
+    
+    Combines the quality score, placeholder detection and the template's
+    required headings; runs locally before any debate round. The score alone
+    saturates easily, so skipping also needs every required section present
+    with a substantive body, which requires a known file template.
+    """
+    if not content or is_placeholder(content):
+        print(f"[*] Pre-gate: draft is empty or has placeholders, full debate")
+        return "full"
+    
+    score = score_content_quality(content, technique_id, existing_content)
+    sections = required_sections(content, file_type)
+    if sections is None:
+        coverage = None
+        complete = False
+    else:
+        found, required = sections
+        coverage = len(found) / required
+        complete = len(found) == required and all(len(body) >= PRE_GATE_MIN_SECTION_CHARS for body in found.values())
+    
+    if score >= PRE_GATE_SKIP_SCORE and complete:
+        decision = "skip"
+    elif score >= PRE_GATE_ABBREVIATED_SCORE and (coverage is None or coverage >= PRE_GATE_ABBREVIATED_COVERAGE):
+        decision = "abbreviated"
+    else:
+        decision = "full"
+    headings = f"{coverage:.0%}" if coverage is not None else "n/a"
+    print(f"[*] Pre-gate: score {score:.2f}, headings {headings} -> {decision} debate")
+    return decision
+
 def check_files(base_path, technique):
     """Check files for security methods (supports both method IDs and MITRE IDs)"""
     
@@ -103,7 +184,7 @@ def check_files(base_path, technique):
                         outdated.append(fname)
     return missing, outdated
 
-def ollama_generate(prompt, model=DEFAULT_MODEL, technique_id=None, existing_content="", max_iterations=3, use_debate=True, research_context=""):
+def ollama_generate(prompt, model=DEFAULT_MODEL, technique_id=None, existing_content="", max_iterations=3, use_debate=True, research_context="", file_type=None, platform=None):
     """Generate content with agent debate system, deep research, and quality validation"""
     
     if use_debate:
@@ -112,15 +193,24 @@ def ollama_generate(prompt, model=DEFAULT_MODEL, technique_id=None, existing_con
         # Use agent debate system for superior quality
         context = f"Technique: {technique_id}" if technique_id else "Content Generation"
         
+        pre_gate = None
+        if DEBATE_PRE_GATE:
+            pre_gate = lambda draft: pre_gate_decision(draft, technique_id, file_type, existing_content)
+        
         final_content, debate_summary = enhanced_generation_with_debate(
             prompt=prompt,
             context=context,
             model=model,
             max_debate_rounds=2,  # 2 rounds for good quality vs speed balance
             consensus_threshold=7.5,
-            research_context=research_context
+            research_context=research_context,
+            pre_gate=pre_gate,
+            checkpoint_key=f"{platform}/{technique_id}/{file_type}" if platform and technique_id and file_type else None
         )
         
+        if debate_summary.get("pre_gate") == "skip":
+            return final_content
+        
         print(f"[+] Agent debate generation complete")
         print(f"[+] Final consensus score: {debate_summary.get('final_consensus', 0):.2f}")
         print(f"[+] Debate rounds: {debate_summary.get('total_rounds', 0)}")
@@ -135,6 +225,14 @@ def ollama_generate(prompt, model=DEFAULT_MODEL, technique_id=None, existing_con
         best_content = ""
         best_score = 0
         
+        # Existing content shares the window with the prompt and the previous-attempt excerpt
+        existing_for_prompt = existing_content
+        if existing_content.strip():
+            existing_for_prompt = fit_sections([
+                PromptSection("prompt", prompt),
+                PromptSection("existing_content", existing_content, priority=0),
+            ], prompt_budget(model) - PREVIOUS_ATTEMPT_TOKENS, label=technique_id or "generation")["existing_content"]
+        
         for iteration in range(max_iterations):
             print(f"[*] Generation iteration {iteration + 1}/{max_iterations}")
             
@@ -144,17 +242,14 @@ def ollama_generate(prompt, model=DEFAULT_MODEL, technique_id=None, existing_con
             # Build iterative prompt with existing content awareness
             iterative_prompt = prompt
             if existing_content.strip():
-                iterative_prompt += f"\n\nEXISTING CONTENT TO ENHANCE/EXPAND:\n{existing_content}\n\nIMPROVE upon the existing content above. Add new insights, examples, and depth while preserving valuable information."
+                iterative_prompt += f"\n\nEXISTING CONTENT TO ENHANCE/EXPAND:\n{existing_for_prompt}\n\nIMPROVE upon the existing content above. Add new insights, examples, and depth while preserving valuable information."
             
             if iteration > 0 and best_content:
                 iterative_prompt += f"\n\nPREVIOUS ATTEMPT (improve upon this):\n{best_content[:500]}...\n\nGenerate BETTER content with more depth, specific examples, and technical accuracy."
             
-            data = {"model": model, "prompt": iterative_prompt, "stream": False, "options": {"temperature": temperature}}
-            
             try:
-                response = requests.post(OLLAMA_URL, json=data, timeout=180)
-                response.raise_for_status()
-                content = response.json().get("response", "")
+                with llm_tags(stage="draft"):
+                    content = get_client().generate(iterative_prompt, model=model, options={"temperature": temperature})
                 
                 # Comprehensive content scoring
                 score = score_content_quality(content, technique_id, existing_content)
@@ -249,8 +344,70 @@ def write_file(file_path, content, preserve_existing=True):
     
     return existing_content
 
+def pipeline_models(model=DEFAULT_MODEL):
+    """Models the pipeline will call (drafts, critics, code), as resolved against the server"""
+    client = get_client()
+    configured = [model, CODE_MODEL or model] + list(default_role_models(model).values())
+    models = []
+    for name in configured:
+        resolved = client.resolve_model(name, fallback=model)
+        if resolved not in models:
+            models.append(resolved)
+    return models
+
 def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
     """Main function to generate security method documentation with enhanced research context."""
+    # Preload every model up front so no technique pays the load cost, release them at the end
+    models = pipeline_models(model)
+    client = get_client()
+    client.warm_up(models)
+    try:
+        generate_platform(platform, model, verbose)
+    finally:
+        client.unload(models)
+        # Where the run spent its tokens and GPU time
+        telemetry = get_telemetry()
+        telemetry.print_summary("stage")
+        if len(telemetry.summarize("technique")) > 2:  # more than one technique besides the total
+            telemetry.print_summary("technique")
+
+def generate_file(technique, fname, file_path, enhanced_prompt, research_context, enhanced_context,
+                  existing_content, method_platform, model=DEFAULT_MODEL, is_stale=False, platform=None):
+    """Generate, score and write one documentation file, returns False if generation failed"""
+    # Generate with agent debate system for higher quality
+    with llm_tags(technique=technique["id"], file=fname):
+        content = ollama_generate(enhanced_prompt, model, technique["id"], existing_content, max_iterations=3, use_debate=True, research_context=research_context, file_type=fname, platform=platform)
+    
+    if content:
+        print(f"[*] Generated content for {fname} ({len(content)} chars):\n{content[:300]}...\n---")
+        
+        # Enhanced content validation
+        quality_score = score_content_quality(content, technique["id"], existing_content)
+        print(f"[*] Content quality score: {quality_score:.2f}/10.0")
+        
+        if quality_score >= 6.0:  # Acceptable quality threshold
+            write_file(file_path, content, preserve_existing=not is_stale)
+            print(f"[+] Generated {fname} for {technique['id']} (score: {quality_score:.2f}, {len(content)} chars)")
+            
+            # Generate comprehensive code examples for code_samples directory
+            if fname == "code_samples/":
+                print(f"[*] Generating comprehensive code examples for {technique['id']}")
+                with llm_tags(technique=technique["id"], file=fname, stage="code_examples"):
+                    generate_comprehensive_code_examples(technique, method_platform, enhanced_context, file_path, model)
+                
+        else:
+            print(f"[-] Content quality below threshold ({quality_score:.2f}), generating fallback")
+            fallback_content = f"# {fname} for {technique['id']}\n\n## Auto-Generated Content (Quality Score: {quality_score:.2f})\n\n{content}\n\n---\n*Note: This content may need manual review and enhancement*"
+            write_file(file_path, fallback_content, preserve_existing=not is_stale)
+        return True
+    
+    print(f"[-] Failed to generate valid content for {fname} in {technique['id']}")
+    placeholder = f"# {fname} for {technique['id']}\n\n[Generation failed after multiple iterations - requires manual review]\n\nResearch Context Available:\n{enhanced_context[:500]}..."
+    write_file(file_path, placeholder)
+    return False
+
+def generate_platform(platform="windows", model=DEFAULT_MODEL, verbose=True):
+    """Generate documentation for every technique on a platform"""
     status = load_status()
     base_path = os.path.dirname(os.path.abspath(__file__))
     
@@ -280,11 +437,20 @@ def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
         missing, outdated = check_files(base_path, technique)
         files_to_generate = missing + outdated
         
+        # Entries marked stale by attack_diff.py are regenerated in full
+        is_stale = technique.get("status") == STALE_STATUS
+        if is_stale:
+            print(f"[*] {technique['id']} is stale ({technique.get('stale_reason', 'ATT&CK update')}), regenerating all files")
+            files_to_generate = list(TEMPLATE_FILES)
+        
         if not files_to_generate:
             if verbose:
                 print(f"[+] All files up-to-date for {technique['id']}")
             continue
-            
+        
+        generation_failed = False
+        research_refreshed = False
+        jobs = []
         for fname in files_to_generate:
             # Determine folder structure based on method vs MITRE
             if is_method:
@@ -301,6 +467,10 @@ def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
             # Check for existing research summary first
             method_platform = technique.get("primary_platform", technique.get("platform", technique_platform))
             existing_summary = research_manager.get_summary(technique["id"], method_platform)
+            # A stale entry's summary was built from the previous ATT&CK release, rebuild it once per technique
+            if existing_summary and is_stale and not research_refreshed:
+                print(f"[*] Cached research for {technique['id']} predates the ATT&CK update, discarding it")
+                existing_summary = None
             if existing_summary:
                 print(f"[+] Found cached research summary (confidence: {existing_summary.confidence_score:.1f}/10)")
                 
@@ -330,11 +500,18 @@ def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
                             all_contexts.append(extra_context)
                             all_sources.extend(extra_sources)
                 
-                # Create and save research summary
+                # Create and save research summary (replaced, not merged, for stale entries)
                 if all_contexts:
-                    research_summary = research_manager.update_summary(
-                        technique["id"], method_platform, all_contexts, all_sources
-                    )
+                    if is_stale:
+                        research_summary = research_manager.create_summary(
+                            technique["id"], method_platform, all_contexts, all_sources
+                        )
+                        research_manager.save_summary(research_summary)
+                        research_refreshed = True
+                    else:
+                        research_summary = research_manager.update_summary(
+                            technique["id"], method_platform, all_contexts, all_sources
+                        )
                     enhanced_context = research_manager.get_summary_for_generation(
                         technique["id"], method_platform, fname
                     )
@@ -347,13 +524,15 @@ def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
                 print(f"[!] {enhanced_context}")
                 if "DEPRECATED" in enhanced_context:
                     placeholder = f"# {fname} for {technique['id']}\n\n{enhanced_context}\n\nThis technique is deprecated and should not be used for new documentation."
-                    write_file(file_path, placeholder)
+                    write_file(file_path, placeholder, preserve_existing=not is_stale)
                     print(f"[!] Skipped deprecated technique {technique['id']}")
                     continue
                 elif "does not exist" in enhanced_context:
                     placeholder = f"# {fname} for {technique['id']}\n\n{enhanced_context}\n\nPlease verify the technique ID is correct."
                     write_file(file_path, placeholder)
                     print(f"[!] Skipped invalid technique {technique['id']}")
+                    # Nothing was regenerated, the entry stays stale
+                    generation_failed = True
                     continue
             
             # Read existing content for enhancement
@@ -368,15 +547,7 @@ def main(platform="windows", model=DEFAULT_MODEL, verbose=True):
             # Create comprehensive prompt with research and code examples
             base_prompt = get_prompt(fname, technique)
             
-            # Enhanced prompt with deep research and code focus
-            enhanced_prompt = f"""{base_prompt}
-
-COMPREHENSIVE RESEARCH CONTEXT:
-{enhanced_context}
-
-AUTHORITATIVE SOURCES: {', '.join(sources[:10])}
-
-ENHANCED GENERATION REQUIREMENTS:
+            requirements = f"""ENHANCED GENERATION REQUIREMENTS:
 1. DEEP TECHNICAL ANALYSIS: Provide detailed technical explanations with specific implementation details
 2. CONCRETE CODE EXAMPLES: Include practical, working code samples with explanations
 3. REAL-WORLD SCENARIOS: Reference actual attack patterns and defensive implementations
@@ -395,45 +566,52 @@ IMPORTANT:
 - Avoid generic security advice - be technique-specific
 - Build upon existing knowledge while adding new insights
 - Focus on actionable, technical content that security professionals can implement"""
+            
+            # Fit the research to the model's context window next to the fixed instructions
+            fitted = fit_sections([
+                PromptSection("instructions", f"{base_prompt}\n\n{requirements}"),
+                PromptSection("research", enhanced_context, priority=1),
+                PromptSection("sources", ', '.join(sources[:10]), priority=0),
+            ], prompt_budget(model), label=f"{technique['id']} {fname}")
+            
+            # Enhanced prompt with deep research and code focus. Research goes first so
+            # prompts for the same technique share a prefix the server can cache.
+            enhanced_prompt = f"""COMPREHENSIVE RESEARCH CONTEXT:
+{fitted['research']}
+
+AUTHORITATIVE SOURCES: {fitted['sources']}
+
+{base_prompt}
+
+{requirements}"""
 
             print(f"[*] Enhanced prompt for {fname}:\n{enhanced_prompt[:400]}...\n---")
             
-            # Generate with agent debate system for higher quality
-            content = ollama_generate(enhanced_prompt, model, technique["id"], existing_content, max_iterations=3, use_debate=True, research_context=enhanced_context)
-            
-            if content:
-                print(f"[*] Generated content for {fname} ({len(content)} chars):\n{content[:300]}...\n---")
-                
-                # Enhanced content validation
-                quality_score = score_content_quality(content, technique["id"], existing_content)
-                print(f"[*] Content quality score: {quality_score:.2f}/10.0")
-                
-                if quality_score >= 6.0:  # Acceptable quality threshold
-                    existing_backup = write_file(file_path, content, preserve_existing=True)
-                    print(f"[+] Generated {fname} for {technique['id']} (score: {quality_score:.2f}, {len(content)} chars)")
-                    
-                    # Generate comprehensive code examples for code_samples directory
-                    if fname == "code_samples/":
-                        print(f"[*] Generating comprehensive code examples for {technique['id']}")
-                        generate_comprehensive_code_examples(technique, method_platform, enhanced_context, file_path)
-                        
-                else:
-                    print(f"[-] Content quality below threshold ({quality_score:.2f}), generating fallback")
-                    fallback_content = f"# {fname} for {technique['id']}\n\n## Auto-Generated Content (Quality Score: {quality_score:.2f})\n\n{content}\n\n---\n*Note: This content may need manual review and enhancement*"
-                    write_file(file_path, fallback_content)
-            else:
-                print(f"[-] Failed to generate valid content for {fname} in {technique['id']}")
-                placeholder = f"# {fname} for {technique['id']}\n\n[Generation failed after multiple iterations - requires manual review]\n\nResearch Context Available:\n{enhanced_context[:500]}..."
-                write_file(file_path, placeholder)
+            jobs.append((fname, file_path, enhanced_prompt, fitted['research'], enhanced_context, existing_content, method_platform))
+        
+        # Research and prompts are built in order above; the per-file generations are
+        # independent and run concurrently on the dispatcher's parallel slots
+        dispatcher = get_dispatcher()
+        futures = [
+            dispatcher.submit(generate_file, technique, *job, model=model, is_stale=is_stale, platform=technique_platform)
+            for job in jobs
+        ]
+        for future in futures:
+            if not future.result():
+                generation_failed = True
+        
+        # Regenerated from the current ATT&CK release; keep stale if anything failed
+        if is_stale and not generation_failed:
+            clear_stale(technique["id"])
 
-def generate_comprehensive_code_examples(technique, platform, context, base_path):
+def generate_comprehensive_code_examples(technique, platform, context, base_path, model=DEFAULT_MODEL):
     """Generate comprehensive code examples for a technique using the enhanced code generator"""
     
     try:
         print(f"[*] Generating comprehensive code examples for {technique['id']}")
         
         # Initialize code examples generator
-        code_generator = CodeExamplesGenerator()
+        code_generator = CodeExamplesGenerator(model)
         
         # Determine appropriate code types based on file structure
         code_types = [CodeType.DETECTION, CodeType.MITIGATION, CodeType.SIMULATION]
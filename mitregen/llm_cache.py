@@ -0,0 +1,164 @@
+"""
+Content-addressed disk cache for LLM responses.
+Entries are keyed by a hash of (model, prompt, options), expire after a TTL
+and are evicted least-recently-used once the cache exceeds its size bound.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "/tmp/llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400
+
+# Evict down to this fraction of the bound so every put doesn't trigger a sweep
+EVICT_TARGET = 0.9
+
+def cache_enabled() -> bool:
+    """Whether the cache is enabled (LLM_CACHE=False disables it, e.g. from the CLIs)"""
+    return os.getenv("LLM_CACHE", "True").lower() not in ("false", "0", "no", "off")
+
+def cache_key(model: str, prompt: str, options: Optional[Dict] = None) -> str:
+    """Stable hash of everything that determines an LLM response"""
+    material = json.dumps({"model": model, "prompt": prompt, "options": options or {}},
+                          sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Size-bounded, TTL-expiring LRU cache of LLM responses on disk"""
+
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl: int = LLM_CACHE_TTL, enabled: Optional[bool] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = cache_enabled() if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        """(path, last_used, size) for every entry on disk"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, or None on miss/expiry"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # Touch mtime so eviction sees this entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get("response")
+
+    def put(self, key: str, response: str, model: str = "") -> None:
+        """Store a response, evicting old entries if over the size bound"""
+        if not self.enabled or not response:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "created": time.time(), "response": response}, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[!] Could not write LLM cache entry: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        """Drop one entry, e.g. a response that turned out to be unusable"""
+        size = self._remove(self._path(key))
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used until under the bound"""
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICT_TARGET
+        removed = 0
+
+        for path, last_used, size in entries:
+            if total <= target and now - last_used <= self.ttl:
+                continue
+            total -= self._remove(path)
+            removed += 1
+
+        self._total_bytes = total
+        if removed:
+            print(f"[*] LLM cache evicted {removed} entries ({total / 1024 / 1024:.1f} MB kept)")
+
+    def clear(self) -> int:
+        """Remove every entry, returns the number removed"""
+        with self._lock:
+            entries = self._entries()
+            for path, _, _ in entries:
+                self._remove(path)
+            self._total_bytes = 0
+        return len(entries)
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
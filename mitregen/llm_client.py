@@ -0,0 +1,568 @@
+"""
+Shared Ollama client used by every generator.
+Keeps one pooled keep-alive session, retries transient failures with
+jittered exponential backoff and owns the timeout policy. Requests are
+routed across one or more Ollama endpoints (OLLAMA_HOSTS) by least
+outstanding requests, failing over when a host goes down.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Add current directory to path for relative imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from .llm_cache import LLMCache, cache_key
+    from .prompt_budget import context_window, estimate_tokens
+    from .llm_telemetry import get_telemetry
+except ImportError:
+    from llm_cache import LLMCache, cache_key
+    from prompt_budget import context_window, estimate_tokens
+    from llm_telemetry import get_telemetry
+
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2-uncensored:7b")
+OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434/api/generate")
+# Comma-separated endpoint pool, optionally with per-host slots: "http://gpu1:11434=4,gpu2:11434=2"
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", "")
+
+# Timeout policy: (connect, read) seconds. Generation on CPU-only hosts is slow,
+# so the read timeout is generous; connect failures should surface quickly.
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "180"))
+
+# Retry policy for transient failures
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+POOL_SIZE = 16
+
+# Requests served concurrently per endpoint, match the server's OLLAMA_NUM_PARALLEL
+NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Streaming: consume NDJSON incrementally, report progress and allow early cut-off
+STREAM = os.getenv("OLLAMA_STREAM", "True").lower() not in ("false", "0", "no", "off")
+MAX_OUTPUT_CHARS = int(os.getenv("LLM_MAX_OUTPUT_CHARS", "20000"))
+PROGRESS_INTERVAL = 2.0
+
+# Keep models resident for the whole run instead of Ollama's 5 minute default, so
+# alternating between critic and writer models does not reload them
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+UNLOAD_AFTER_RUN = os.getenv("OLLAMA_UNLOAD_AFTER_RUN", "True").lower() not in ("false", "0", "no", "off")
+
+# Endpoint health: a host that fails to connect is skipped for this long, then re-probed
+HEALTH_RETRY_AFTER = 30.0
+HEALTH_TIMEOUT = (CONNECT_TIMEOUT, 5.0)
+
+# Errors that mean the host itself is unusable, as opposed to a slow generation
+FAILOVER_ERRORS = (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+def normalize_host(url: str) -> str:
+    """Base URL of an Ollama server from OLLAMA_HOST
+
+    Accepts a bare host:port, a base URL or a full /api/generate URL.
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    return url.split("/api/")[0].rstrip("/")
+
+class LLMError(Exception):
+    """Raised when an LLM request fails after all retries"""
+
+class JSONObjectStop:
+    """Stream stop condition: true once the first top-level JSON object has closed
+
+    Fed chunk by chunk so the whole response is only scanned once.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def __call__(self, chunk: str) -> bool:
+        for ch in chunk:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.started:
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+class Endpoint:
+    """One Ollama server in the pool"""
+
+    def __init__(self, url: str, parallel: int = NUM_PARALLEL):
+        self.base_url = normalize_host(url)
+        self.parallel = parallel
+        self.outstanding = 0
+        self.healthy = True
+        self.retry_after = 0.0
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.parallel
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.base_url}, {self.outstanding}/{self.parallel}, healthy={self.healthy})"
+
+def endpoints_from_env() -> List[Endpoint]:
+    """Endpoint pool from OLLAMA_HOSTS, falling back to the single OLLAMA_HOST"""
+    endpoints = []
+    for spec in (OLLAMA_HOSTS or OLLAMA_URL).split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        url, _, slots = spec.partition("=")
+        endpoints.append(Endpoint(url, int(slots) if slots else NUM_PARALLEL))
+    return endpoints
+
+class EndpointPool:
+    """Least-outstanding-requests routing with health tracking"""
+
+    def __init__(self, endpoints: List[Endpoint], session: requests.Session):
+        if not endpoints:
+            raise ValueError("At least one Ollama endpoint is required")
+        self.endpoints = endpoints
+        self.session = session
+        self._cond = threading.Condition()
+
+    @property
+    def parallel(self) -> int:
+        return sum(e.parallel for e in self.endpoints)
+
+    def _candidates(self, exclude: Optional[Endpoint]) -> List[Endpoint]:
+        now = time.time()
+        usable = [e for e in self.endpoints if e.healthy or now >= e.retry_after]
+        if exclude is not None and len(usable) > 1:
+            usable = [e for e in usable if e is not exclude]
+        # With every host down, keep trying all of them rather than failing outright
+        return usable or list(self.endpoints)
+
+    def acquire(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        """Reserve a slot on the least loaded usable endpoint, waiting for a free slot"""
+        while True:
+            with self._cond:
+                while True:
+                    free = [e for e in self._candidates(exclude) if e.outstanding < e.parallel]
+                    if free:
+                        endpoint = min(free, key=lambda e: e.load)
+                        endpoint.outstanding += 1
+                        break
+                    self._cond.wait(timeout=1.0)
+
+            # Re-probe a host whose back-off period has expired before trusting it again.
+            # With nowhere else to go, hand it out anyway so the caller's retry budget applies.
+            if endpoint.healthy or self.probe(endpoint) or not self.has_alternative(endpoint):
+                return endpoint
+            self.release(endpoint)
+
+    def release(self, endpoint: Endpoint) -> None:
+        with self._cond:
+            endpoint.outstanding -= 1
+            self._cond.notify_all()
+
+    def mark_down(self, endpoint: Endpoint, error: Exception) -> None:
+        with self._cond:
+            if endpoint.healthy:
+                print(f"[-] Ollama endpoint {endpoint.base_url} is down: {error}")
+            endpoint.healthy = False
+            endpoint.retry_after = time.time() + HEALTH_RETRY_AFTER
+
+    def has_alternative(self, endpoint: Endpoint) -> bool:
+        now = time.time()
+        return any(e is not endpoint and (e.healthy or now >= e.retry_after) for e in self.endpoints)
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        """Health check an endpoint via /api/version and update its state"""
+        try:
+            response = self.session.get(f"{endpoint.base_url}/api/version", timeout=HEALTH_TIMEOUT)
+            if response.status_code >= 500:
+                raise LLMError(f"HTTP {response.status_code} from health check")
+        except (requests.RequestException, LLMError) as e:
+            self.mark_down(endpoint, e)
+            return False
+        with self._cond:
+            if not endpoint.healthy:
+                print(f"[+] Ollama endpoint {endpoint.base_url} is back up")
+            endpoint.healthy = True
+            self._cond.notify_all()
+        return True
+
+    def check_health(self) -> Dict[str, bool]:
+        """Probe every endpoint, returns base URL -> healthy"""
+        return {e.base_url: self.probe(e) for e in self.endpoints}
+
+class OllamaClient:
+    """Pooled, retrying client for the Ollama HTTP API"""
+
+    def __init__(self, url: Optional[str] = None, max_retries: int = MAX_RETRIES,
+                 timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 pool_size: int = POOL_SIZE, cache: Optional[LLMCache] = None,
+                 parallel: int = NUM_PARALLEL, endpoints: Optional[List[Endpoint]] = None):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = cache if cache is not None else LLMCache()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        if endpoints is None:
+            endpoints = [Endpoint(url, parallel)] if url else endpoints_from_env()
+        self.pool = EndpointPool(endpoints, self.session)
+        self._models: Optional[set] = None
+        self._missing_models: set = set()
+        self._models_lock = threading.Lock()
+
+    @property
+    def parallel(self) -> int:
+        """Total requests that can be in flight across all endpoints"""
+        return self.pool.parallel
+
+    def check_health(self) -> Dict[str, bool]:
+        return self.pool.check_health()
+
+    def _set_keep_alive(self, endpoint: Endpoint, model: str, keep_alive, timeout: Tuple[float, float]) -> float:
+        """Load (or with keep_alive=0 unload) a model on one endpoint, returns seconds taken
+
+        Sends the same num_ctx as real calls, Ollama reloads a model whose context size changes.
+        """
+        start = time.time()
+        payload = {"model": model, "keep_alive": keep_alive, "stream": False,
+                   "options": self._options(model, None)}
+        response = self.session.post(f"{endpoint.base_url}/api/generate", json=payload, timeout=timeout)
+        response.raise_for_status()
+        elapsed = time.time() - start
+        if keep_alive:
+            try:
+                meta = response.json()
+            except ValueError:
+                meta = {}
+            get_telemetry().record(model, "/api/generate", meta, elapsed, stage="warmup")
+        return elapsed
+
+    def warm_up(self, models: List[str]) -> None:
+        """Preload models on every reachable endpoint with the run's keep_alive
+
+        Endpoints load in parallel; models on one endpoint load in turn.
+        """
+
+        def load_all(endpoint: Endpoint) -> None:
+            for model in models:
+                try:
+                    elapsed = self._set_keep_alive(endpoint, model, KEEP_ALIVE, self.timeout)
+                    print(f"[+] Loaded {model} on {endpoint.base_url} ({elapsed:.1f}s, keep_alive {KEEP_ALIVE})")
+                except requests.RequestException as e:
+                    print(f"[-] Could not preload {model} on {endpoint.base_url}: {e}")
+
+        print(f"[*] Warming up {len(models)} model(s): {', '.join(models)}")
+        threads = [threading.Thread(target=load_all, args=(e,)) for e in self.pool.endpoints
+                   if e.healthy or self.pool.probe(e)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def unload(self, models: List[str]) -> None:
+        """Release models on every endpoint (keep_alive=0)"""
+        if not UNLOAD_AFTER_RUN:
+            return
+        unloaded = 0
+        for endpoint in self.pool.endpoints:
+            if not endpoint.healthy:
+                continue
+            for model in models:
+                try:
+                    self._set_keep_alive(endpoint, model, 0, HEALTH_TIMEOUT)
+                    unloaded += 1
+                except requests.RequestException as e:
+                    print(f"[-] Could not unload {model} on {endpoint.base_url}: {e}")
+        if unloaded:
+            print(f"[*] Unloaded {', '.join(models)}")
+
+    def available_models(self) -> Optional[set]:
+        """Model names installed on the server (via /api/tags), None if unknown
+
+        Every endpoint in the pool is expected to serve the same models.
+        """
+        with self._models_lock:
+            if self._models is None:
+                for endpoint in self.pool.endpoints:
+                    try:
+                        response = self.session.get(f"{endpoint.base_url}/api/tags", timeout=HEALTH_TIMEOUT)
+                        response.raise_for_status()
+                        self._models = {m["name"] for m in response.json().get("models", [])}
+                        break
+                    except (requests.RequestException, ValueError, KeyError):
+                        continue
+            return self._models
+
+    def resolve_model(self, model: str, fallback: str = DEFAULT_MODEL) -> str:
+        """Configured model if installed, otherwise the fallback (warned once per model)"""
+        if model == fallback:
+            return model
+        models = self.available_models()
+        if models is None or model in models or f"{model}:latest" in models:
+            return model
+        if model not in self._missing_models:
+            self._missing_models.add(model)
+            print(f"[!] Model {model} is not installed, falling back to {fallback}")
+        return fallback
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+    def _call(self, path: str, payload: Dict, handler: Callable[[requests.Response], Dict],
+              timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """POST a JSON payload and pass the response to handler, with routing and retries
+
+        The endpoint slot is held until the handler has consumed the response.
+        Connection failures mark the host down and the retry goes to another one.
+        """
+        last_error = None
+        last_endpoint = None
+
+        for attempt in range(self.max_retries + 1):
+            endpoint = self.pool.acquire(exclude=last_endpoint)
+            url = f"{endpoint.base_url}{path}"
+            try:
+                response = self.session.post(url, json=payload, timeout=timeout or self.timeout, stream=True)
+                if response.status_code in RETRY_STATUS_CODES:
+                    last_error = LLMError(f"HTTP {response.status_code} from {url}")
+                    response.close()
+                else:
+                    response.raise_for_status()
+                    return handler(response)
+            except FAILOVER_ERRORS as e:
+                last_error = e
+                self.pool.mark_down(endpoint, e)
+            except requests.Timeout as e:
+                last_error = e
+            except requests.HTTPError as e:
+                # Client errors (unknown model, bad request) will not succeed on retry
+                raise LLMError(f"{e} ({response.text[:200]})") from e
+            finally:
+                self.pool.release(endpoint)
+            last_endpoint = endpoint
+
+            if attempt < self.max_retries:
+                if self.pool.has_alternative(endpoint):
+                    print(f"[!] LLM request to {endpoint.base_url} failed ({last_error}), failing over "
+                          f"({attempt + 1}/{self.max_retries})")
+                    continue
+                delay = self._backoff(attempt)
+                print(f"[!] LLM request failed ({last_error}), retrying in {delay:.1f}s "
+                      f"({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+        raise LLMError(f"LLM request to {path} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def request(self, path: str, payload: Dict, timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Non-streaming API call, returns the decoded JSON body"""
+        return self._call(path, payload, lambda response: response.json(), timeout)
+
+    def stream_request(self, path: str, payload: Dict, timeout: Optional[Tuple[float, float]] = None,
+                       stop: Optional[Callable[[str], bool]] = None,
+                       max_chars: Optional[int] = None) -> Dict:
+        """Streaming API call, consumes NDJSON chunks until done or a stop condition
+
+        Returns the final chunk's metadata with the accumulated text under
+        "response" and "truncated" set when reading was cut off early. The read
+        timeout applies between chunks, so it acts as a stall timeout. A stream
+        that breaks mid-way is restarted from scratch on another endpoint.
+        """
+        payload = dict(payload, stream=True)
+
+        def handler(response: requests.Response) -> Dict:
+            if hasattr(stop, "reset"):
+                stop.reset()
+            return self._consume_stream(response, stop, max_chars)
+
+        return self._call(path, payload, handler, timeout)
+
+    def _consume_stream(self, response: requests.Response, stop: Optional[Callable[[str], bool]],
+                        max_chars: Optional[int]) -> Dict:
+        parts = []
+        length = 0
+        tokens = 0
+        final: Dict = {}
+        truncated = False
+        start = last_report = time.time()
+        first_token = None
+        show_progress = sys.stdout.isatty()
+        drained = False
+
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise LLMError(chunk["error"])
+                # /api/generate streams "response", /api/chat streams "message.content"
+                text = chunk.get("response") or chunk.get("message", {}).get("content", "")
+                if text:
+                    if first_token is None:
+                        first_token = time.time()
+                    parts.append(text)
+                    length += len(text)
+                    tokens += 1
+                if chunk.get("done"):
+                    # Read on to the end of the body so the connection returns to the pool
+                    final = chunk
+                    continue
+                if (stop and text and stop(text)) or (max_chars and length >= max_chars):
+                    truncated = True
+                    break
+                now = time.time()
+                if show_progress and now - last_report >= PROGRESS_INTERVAL:
+                    print(f"\r[*] {tokens} tokens, {tokens / (now - start):.1f} tok/s", end="", flush=True)
+                    last_report = now
+            drained = not truncated
+        finally:
+            # Closing the connection of a stream cut off early makes Ollama abort the generation
+            if not drained:
+                response.close()
+
+        elapsed = time.time() - start
+        if show_progress and elapsed >= PROGRESS_INTERVAL:
+            print()
+        tokens = final.get("eval_count", tokens)
+        cut = " (stopped early)" if truncated else ""
+        print(f"[*] Generated {tokens} tokens in {elapsed:.1f}s ({tokens / max(elapsed, 1e-6):.1f} tok/s){cut}")
+
+        text = "".join(parts)
+        if max_chars and len(text) > max_chars:
+            text = text[:max_chars]
+        final = dict(final, response=text, truncated=truncated, eval_count=tokens)
+        # A stream cut off early has no final metadata, time to first token stands in for prompt eval
+        if "eval_duration" not in final:
+            first_token = first_token or start
+            final["prompt_eval_duration"] = int((first_token - start) * 1e9)
+            final["eval_duration"] = int((time.time() - first_token) * 1e9)
+        final.pop("message", None)
+        return final
+
+    def _options(self, model: str, options: Optional[Dict]) -> Dict:
+        """Request options with num_ctx pinned to the window prompts are budgeted for"""
+        options = dict(options or {})
+        options.setdefault("num_ctx", context_window(model))
+        return options
+
+    def _complete(self, path: str, payload: Dict, cache_prompt: str, timeout: Optional[Tuple[float, float]],
+                  use_cache: bool, stream: bool, stop: Optional[Callable[[str], bool]],
+                  max_chars: Optional[int], validate: Optional[Callable[[str], object]] = None) -> str:
+        """Shared cache/stream handling for generate() and chat()
+
+        With validate, only responses it accepts are cached; a cached response it
+        rejects (ValueError) is dropped and fetched again. A response that fails
+        validation raises ValueError.
+        """
+        model = payload["model"]
+        key_material = {k: v for k, v in payload.items()
+                        if k not in ("model", "prompt", "messages", "stream", "keep_alive")}
+        if stream and max_chars:
+            key_material["max_chars"] = max_chars
+        key = cache_key(model, cache_prompt, key_material)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                try:
+                    if validate:
+                        validate(cached)
+                    print(f"[*] LLM cache hit ({model}, {len(cached)} chars)")
+                    get_telemetry().record(model, path, None, 0.0, cached=True)
+                    return cached
+                except ValueError:
+                    self.cache.delete(key)
+
+        start = time.time()
+        if stream:
+            meta = self.stream_request(path, payload, timeout, stop, max_chars)
+            response = meta.get("response", "")
+            meta.setdefault("prompt_eval_count", estimate_tokens(cache_prompt))
+        else:
+            meta = self.request(path, dict(payload, stream=False), timeout)
+            response = meta.get("response") or meta.get("message", {}).get("content", "")
+        get_telemetry().record(model, path, meta, time.time() - start)
+
+        if validate:
+            validate(response)
+        if use_cache:
+            self.cache.put(key, response, model)
+        return response
+
+    def generate(self, prompt: str, model: str = DEFAULT_MODEL, options: Optional[Dict] = None,
+                 timeout: Optional[Tuple[float, float]] = None, use_cache: bool = True,
+                 stream: bool = STREAM, stop: Optional[Callable[[str], bool]] = None,
+                 max_chars: Optional[int] = MAX_OUTPUT_CHARS,
+                 validate: Optional[Callable[[str], object]] = None, **extra) -> str:
+        """Run an /api/generate call and return the response text
+
+        Identical (model, prompt, options) calls are served from the LLM cache.
+        When streaming, reading stops once `stop(chunk)` returns true or the
+        output reaches `max_chars`. `validate(text)` raising ValueError keeps a
+        response out of the cache.
+        """
+        payload = {"model": model, "prompt": prompt, "options": self._options(model, options),
+                   "keep_alive": KEEP_ALIVE}
+        payload.update(extra)
+        return self._complete("/api/generate", payload, prompt, timeout, use_cache, stream, stop, max_chars,
+                              validate)
+
+    def chat(self, messages: List[Dict], model: str = DEFAULT_MODEL, options: Optional[Dict] = None,
+             timeout: Optional[Tuple[float, float]] = None, use_cache: bool = True,
+             stream: bool = STREAM, stop: Optional[Callable[[str], bool]] = None,
+             max_chars: Optional[int] = MAX_OUTPUT_CHARS,
+             validate: Optional[Callable[[str], object]] = None, **extra) -> str:
+        """Run an /api/chat call and return the assistant message text
+
+        Calls that share leading messages (e.g. one system message per debate
+        round) share a prompt prefix the server can serve from its KV cache.
+        """
+        payload = {"model": model, "messages": messages, "options": self._options(model, options),
+                   "keep_alive": KEEP_ALIVE}
+        payload.update(extra)
+        cache_prompt = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+        return self._complete("/api/chat", payload, cache_prompt, timeout, use_cache, stream, stop, max_chars,
+                              validate)
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> OllamaClient:
+    """Process-wide shared client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
@@ -0,0 +1,78 @@
+"""
+Concurrent LLM job dispatcher.
+Accepts prompt jobs from the generation, debate and code-example stages and
+keeps as many requests in flight as the inference server has parallel slots,
+handing back futures instead of blocking on each call.
+"""
+
+import os
+import sys
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+# Add current directory to path for relative imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from .llm_client import OllamaClient, get_client
+except ImportError:
+    from llm_client import OllamaClient, get_client
+
+_worker = threading.local()
+
+class LLMDispatcher:
+    """Thread-pool dispatcher sized to the client's parallel slots"""
+
+    def __init__(self, client: Optional[OllamaClient] = None, max_in_flight: Optional[int] = None):
+        self.client = client or get_client()
+        self.max_in_flight = max_in_flight or self.client.parallel
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="llm")
+
+    def _run(self, fn: Callable, *args, **kwargs):
+        _worker.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _worker.active = False
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule a job that makes LLM calls, returns its future
+
+        Jobs submitted from inside a dispatcher worker run inline, so a job
+        that fans out further cannot deadlock waiting on its own pool.
+        """
+        if getattr(_worker, "active", False):
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        # Carry context variables (e.g. the technique being generated) into the worker
+        ctx = contextvars.copy_context()
+        return self.executor.submit(ctx.run, self._run, fn, *args, **kwargs)
+
+    def generate(self, prompt: str, **kwargs) -> Future:
+        """Schedule a single generate() call"""
+        return self.submit(self.client.generate, prompt, **kwargs)
+
+    def map(self, fn: Callable, *iterables) -> List[Future]:
+        """Submit fn over the zipped iterables, futures are returned in input order"""
+        return [self.submit(fn, *args) for args in zip(*iterables)]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+_dispatcher: Optional[LLMDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher() -> LLMDispatcher:
+    """Process-wide shared dispatcher"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher()
+        return _dispatcher
@@ -0,0 +1,160 @@
+"""
+Per-call LLM inference telemetry.
+Records the timing metadata Ollama returns with every completion (token
+counts, load/prompt-eval/eval durations), tagged with the technique, file,
+stage and agent role active when the call was made, and summarizes where a
+run spent its tokens and GPU time.
+"""
+
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+# Optional JSONL file every call record is appended to
+TELEMETRY_FILE = os.getenv("LLM_TELEMETRY_FILE", "")
+
+TAG_NAMES = ("technique", "file", "stage", "role")
+
+_tags: contextvars.ContextVar = contextvars.ContextVar("llm_tags", default={})
+
+def current_tags() -> Dict[str, str]:
+    """Tags active in the current context"""
+    return dict(_tags.get())
+
+@contextmanager
+def llm_tags(**tags) -> Iterator[None]:
+    """Tag every LLM call made inside the block
+
+    Nested stages are joined as parent/child (e.g. "code_examples/critique"),
+    other tags are overridden. The dispatcher copies context into its
+    workers, so tags follow jobs across threads.
+    """
+    current = _tags.get()
+    merged = dict(current)
+    for name, value in tags.items():
+        if value is None:
+            continue
+        if name == "stage" and current.get("stage"):
+            value = f"{current['stage']}/{value}"
+        merged[name] = str(value)
+    token = _tags.set(merged)
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+@dataclass
+class CallRecord:
+    """One LLM call and its server-reported cost"""
+    model: str
+    path: str
+    technique: str = ""
+    file: str = ""
+    stage: str = ""
+    role: str = ""
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    load_seconds: float = 0.0
+    prompt_eval_seconds: float = 0.0
+    eval_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    cached: bool = False
+    truncated: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+class LLMTelemetry:
+    """Thread-safe collector of call records"""
+
+    def __init__(self, path: str = TELEMETRY_FILE):
+        self.path = path
+        self.records: List[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, model: str, path: str, meta: Optional[Dict], wall_seconds: float,
+               cached: bool = False, **tags) -> CallRecord:
+        """Record a call from the response's final metadata (durations are in ns)"""
+        meta = meta or {}
+        tags = dict(current_tags(), **tags)
+        record = CallRecord(
+            model=model,
+            path=path,
+            prompt_tokens=meta.get("prompt_eval_count", 0),
+            output_tokens=meta.get("eval_count", 0),
+            load_seconds=meta.get("load_duration", 0) / 1e9,
+            prompt_eval_seconds=meta.get("prompt_eval_duration", 0) / 1e9,
+            eval_seconds=meta.get("eval_duration", 0) / 1e9,
+            wall_seconds=wall_seconds,
+            cached=cached,
+            truncated=bool(meta.get("truncated")),
+            **{name: tags[name] for name in TAG_NAMES if name in tags}
+        )
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(asdict(record)) + "\n")
+                except OSError as e:
+                    print(f"[!] Could not write LLM telemetry: {e}")
+        return record
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records = []
+
+    def summarize(self, by: str = "stage") -> Dict[str, Dict]:
+        """Totals per value of a tag (or "model"), plus an overall "total" row"""
+        with self._lock:
+            records = list(self.records)
+
+        groups: Dict[str, Dict] = {}
+        for record in records:
+            for name in (getattr(record, by) or "untagged", "total"):
+                group = groups.setdefault(name, {
+                    "calls": 0, "cached": 0, "prompt_tokens": 0, "output_tokens": 0,
+                    "load_seconds": 0.0, "prompt_eval_seconds": 0.0, "eval_seconds": 0.0,
+                    "wall_seconds": 0.0,
+                })
+                group["calls"] += 1
+                group["cached"] += int(record.cached)
+                group["prompt_tokens"] += record.prompt_tokens
+                group["output_tokens"] += record.output_tokens
+                group["load_seconds"] += record.load_seconds
+                group["prompt_eval_seconds"] += record.prompt_eval_seconds
+                group["eval_seconds"] += record.eval_seconds
+                group["wall_seconds"] += record.wall_seconds
+
+        for group in groups.values():
+            group["tokens_per_sec"] = group["output_tokens"] / group["eval_seconds"] if group["eval_seconds"] else 0.0
+        return groups
+
+    def print_summary(self, by: str = "stage") -> None:
+        """Print a per-run table of tokens and load vs evaluation time"""
+        groups = self.summarize(by)
+        if not groups:
+            return
+        total = groups.pop("total")
+        print(f"\n[*] LLM usage by {by}: {total['calls']} calls ({total['cached']} cached)")
+        print(f"    {by:<32} {'calls':>5} {'tok in':>8} {'tok out':>8} {'tok/s':>7} "
+              f"{'load s':>7} {'prompt s':>8} {'eval s':>8}")
+        rows = sorted(groups.items(), key=lambda item: -item[1]["eval_seconds"])
+        for name, group in rows + [("total", total)]:
+            print(f"    {name[:32]:<32} {group['calls']:>5} {group['prompt_tokens']:>8} "
+                  f"{group['output_tokens']:>8} {group['tokens_per_sec']:>7.1f} {group['load_seconds']:>7.1f} "
+                  f"{group['prompt_eval_seconds']:>8.1f} {group['eval_seconds']:>8.1f}")
+
+_telemetry: Optional[LLMTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry() -> LLMTelemetry:
+    """Process-wide shared telemetry collector"""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = LLMTelemetry()
+        return _telemetry
@@ -0,0 +1,128 @@
+"""
+Context-window-aware prompt budgeting.
+Estimates token counts per model and trims prompt sections by priority so a
+prompt always fits the model's window instead of being silently truncated
+by the server after its tokens have been evaluated.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Native context windows by model family (name before the ":tag")
+MODEL_CONTEXT_WINDOWS = {
+    "llama2": 4096,
+    "llama2-uncensored": 4096,
+    "codellama": 16384,
+    "llama3": 8192,
+    "llama3.1": 131072,
+    "llama3.2": 131072,
+    "mistral": 32768,
+    "mixtral": 32768,
+    "gemma": 8192,
+    "gemma2": 8192,
+    "phi3": 4096,
+    "qwen2.5": 32768,
+    "qwen2.5-coder": 32768,
+    "deepseek-coder": 16384,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# Large windows cost memory on the server, so the window we request is capped
+# unless OLLAMA_NUM_CTX pins it explicitly
+MAX_NUM_CTX = int(os.getenv("OLLAMA_MAX_NUM_CTX", "8192"))
+NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+
+# Share of the window kept free for the generated output
+OUTPUT_RESERVE = 0.25
+
+# Conservative average for English prose mixed with code and identifiers
+CHARS_PER_TOKEN = 3.5
+
+TRIM_MARKER = "\n[... {chars} chars trimmed to fit context window ...]\n"
+
+def context_window(model: str) -> int:
+    """Context window (num_ctx) used for a model"""
+    if NUM_CTX:
+        return NUM_CTX
+    family = model.split(":")[0].lower()
+    native = MODEL_CONTEXT_WINDOWS.get(family, DEFAULT_CONTEXT_WINDOW)
+    return min(native, MAX_NUM_CTX)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for a piece of text"""
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+def prompt_budget(model: str) -> int:
+    """Tokens available to a prompt after reserving room for the output"""
+    window = context_window(model)
+    return window - int(window * OUTPUT_RESERVE)
+
+@dataclass
+class PromptSection:
+    """One named part of a prompt
+
+    Sections with priority None are never trimmed; otherwise lower priority
+    is trimmed first. keep="head" keeps the start of the text, keep="tail"
+    keeps the end (e.g. the most recent debate history).
+    """
+    name: str
+    text: str
+    priority: Optional[int] = None
+    keep: str = "head"
+    min_tokens: int = 0
+
+def _trim(text: str, max_tokens: int, keep: str) -> str:
+    """Cut text to roughly max_tokens on a line boundary, marking the cut"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    # The marker itself counts against the allowance
+    max_chars -= len(TRIM_MARKER.format(chars=len(text)))
+    if max_chars <= 0:
+        return ""
+
+    if keep == "tail":
+        kept = text[-max_chars:]
+        newline = kept.find("\n")
+        if 0 <= newline < len(kept) // 2:
+            kept = kept[newline + 1:]
+        return TRIM_MARKER.format(chars=len(text) - len(kept)).lstrip("\n") + kept
+
+    kept = text[:max_chars]
+    newline = kept.rfind("\n")
+    if newline > len(kept) // 2:
+        kept = kept[:newline]
+    return kept + TRIM_MARKER.format(chars=len(text) - len(kept)).rstrip("\n")
+
+def fit_sections(sections: List[PromptSection], budget: int, label: str = "") -> Dict[str, str]:
+    """Trim sections by priority until their total fits the token budget
+
+    Returns section name -> (possibly trimmed) text and logs what was dropped.
+    """
+    fitted = {s.name: s.text for s in sections}
+    total = sum(estimate_tokens(s.text) for s in sections)
+    if total <= budget:
+        return fitted
+
+    overflow = total - budget
+    dropped = []
+    trimmable = sorted((s for s in sections if s.priority is not None), key=lambda s: s.priority)
+
+    for section in trimmable:
+        if overflow <= 0:
+            break
+        tokens = estimate_tokens(section.text)
+        target = max(section.min_tokens, tokens - overflow)
+        if target >= tokens:
+            continue
+        fitted[section.name] = _trim(section.text, target, section.keep)
+        removed = tokens - estimate_tokens(fitted[section.name])
+        overflow -= removed
+        dropped.append(f"{section.name} -{removed}")
+
+    where = f" for {label}" if label else ""
+    print(f"[!] Prompt budget{where}: {total} > {budget} tokens, trimmed {', '.join(dropped) or 'nothing'}")
+    if overflow > 0:
+        print(f"[!] Prompt{where} still {overflow} tokens over budget after trimming")
+    return fitted
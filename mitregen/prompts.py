@@ -327,6 +327,11 @@ Structure your response as:
 Focus on actionable insights and technical depth."""
 }
 
+def required_headings(fname):
+    """Section titles (## headings) a file's template asks for"""
+    template = PROMPT_TEMPLATES.get(fname, "")
+    return [line[3:].strip() for line in template.splitlines() if line.startswith("## ")]
+
 def get_prompt(fname, technique):
     """Get prompt template for technique/method (handles both formats)"""
     template = PROMPT_TEMPLATES.get(fname, "Write documentation for {id} {fname} on {platform}.")
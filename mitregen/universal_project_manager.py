@@ -171,9 +171,10 @@ class UniversalProjectManager:
         }
         
         print("[*] Validating MITRE techniques...")
+        validations = self.mitre_researcher.validate_techniques([t["id"] for t in self.mitre_techniques])
         for technique in self.mitre_techniques:
             technique_id = technique["id"]
-            validation = self.mitre_researcher.validate_technique(technique_id)
+            validation = validations[technique_id]
             
             if not validation["valid"]:
                 validation_results["mitre"]["invalid"].append(technique_id)
@@ -334,22 +335,11 @@ if __name__ == "__main__":
     mitre_researcher = manager.mitre_researcher
     # Fetch MITRE techniques (enterprise-attack)
     try:
-        # Use MITREResearcher to fetch all techniques
-        url = f"{mitre_researcher.api_base}/enterprise-attack/enterprise-attack.json"
-        cache_file = os.path.join("/tmp", "enterprise-attack.json")
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                data = json.load(f)
-        else:
-            import requests
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            with open(cache_file, 'w') as f:
-                json.dump(data, f)
+        # Use MITREResearcher's conditionally refreshed, indexed bundle cache
+        store = mitre_researcher.get_store()
         # Extract techniques and sub-techniques
         techniques = []
-        for obj in data.get("objects", []):
+        for obj in store.get_objects_by_type("attack-pattern"):
             if obj.get("type") == "attack-pattern":
                 ext_refs = obj.get("external_references", [])
                 mitre_id = None